@@ -1,65 +1,194 @@
+"""Sample dialogues from guide files into one annotation file per annotator.
+
+Every dialogue gets a pseudo-random priority derived from the seed and its ID,
+and the dialogues with the lowest priorities are kept. Input files are streamed
+one record at a time, so memory stays proportional to the sample rather than
+the corpus. Files are scanned in parallel worker processes, and the result for
+a given seed does not depend on the number of workers. No dialogue is given to
+more than one annotator.
+
+With --stratify, the sample is split across strata (the dialogue's split, its
+first non-chitchat user intent such as find_restaurant, or both) in proportion
+to their size, and each annotator gets an even share of every stratum.
+
+    python TACT_interraction_datas/sampling_script.py TACT_interraction_datas/slurp/*.json \\
+        --annotators 4 --per-annotator 9 --stratify split intent --seed 13
+"""
+import argparse
+import hashlib
+import heapq
 import json
+import os
 import random
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from guide_reader import iter_records
+from turn_parser import DialogueTurns
+
+
+def priority(seed, dialogue_id):
+    """Uniform pseudo-random priority in [0, 1), the same in every process for a given seed."""
+    digest = hashlib.blake2b(f"{seed}:{dialogue_id}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') / 2 ** 64
+
+
+def primary_intent(record):
+    first = None
+    # Turns are parsed lazily, so this usually stops after the first few lines
+    for turn in DialogueTurns(record.get("generated_data", "")):
+        if turn.speaker == "USER" and turn.intent:
+            if turn.intent != "chitchat":
+                return turn.intent
+            first = first or turn.intent
+    return first or "none"
+
+
+def stratum_of(record, stratify):
+    values = []
+    if "split" in stratify:
+        values.append(str(record.get("split", "unknown")))
+    if "intent" in stratify:
+        values.append(primary_intent(record))
+    return "/".join(values) or "all"
+
+
+def sample_file(file_index, file_path, seed, capacity, stratify):
+    """Stream one file and keep the capacity lowest-priority dialogues of each stratum.
+
+    Returns (stratum counts, {stratum: [(priority, file_index, dialogue_id, record), ...]}).
+    A dialogue ID repeated in the file keeps its last record, as with json.load.
+    """
+    counts = Counter()
+    reservoirs = {}
+    # Stratum of every dialogue ID currently held in a reservoir
+    kept = {}
+    for dialogue_id, record in iter_records(file_path):
+        stratum = stratum_of(record, stratify)
+        counts[stratum] += 1
+        if dialogue_id in kept:
+            earlier = reservoirs[kept.pop(dialogue_id)]
+            earlier[:] = [entry for entry in earlier if entry[2] != dialogue_id]
+            heapq.heapify(earlier)
+        # heapq is a min-heap, so negated priorities keep the largest one on top for replacement
+        entry = (-priority(seed, dialogue_id), file_index, dialogue_id, record)
+        reservoir = reservoirs.setdefault(stratum, [])
+        if len(reservoir) < capacity:
+            heapq.heappush(reservoir, entry)
+            kept[dialogue_id] = stratum
+        elif entry[0] > reservoir[0][0]:
+            del kept[heapq.heapreplace(reservoir, entry)[2]]
+            kept[dialogue_id] = stratum
+
+    return counts, {
+        stratum: sorted((-neg_priority, index, dialogue_id, record)
+                        for neg_priority, index, dialogue_id, record in reservoir)
+        for stratum, reservoir in reservoirs.items()
+    }
+
 
-# Load the JSON file
-file_path = r"C:/Users/namyeong/Desktop/revision/human_llm_intetraction/TACT_SLURP_guide_diverse_flows_20250416.json"
-
-with open(file_path, 'r', encoding='utf-8-sig') as f:
-    data = json.load(f)
-
-# Check the type of data structure
-print(f"Data type: {type(data)}")
-if isinstance(data, list):
-    print(f"Total items: {len(data)}")
-elif isinstance(data, dict):
-    print(f"Number of keys: {len(data.keys())}")
-    print(f"Keys: {list(data.keys())[:5]} ...")
-
-# Convert data to list if it's a dictionary
-if isinstance(data, dict):
-    items = list(data.items())
-else:
-    items = data
-
-# Calculate how many unique items we can sample
-total_needed = 9 * 4  # 36 items total
-available_items = len(items)
-print(f"Total items needed: {total_needed}, Available items: {available_items}")
-
-if available_items < total_needed:
-    print(f"Warning: Not enough items. Can only create {available_items // 9} complete samples of 9 items each.")
-    # Use as many items as possible
-    num_samples = min(4, available_items // 9)
-    items_per_sample = 9
-else:
-    num_samples = 4
-    items_per_sample = 9
-
-# Randomly sample without replacement for all samples
-# This ensures no duplicates across all samples
-random.shuffle(items)
-all_sampled_items = items[:num_samples * items_per_sample]
-
-# Create samples
-samples = []
-for i in range(num_samples):
-    start_idx = i * items_per_sample
-    end_idx = start_idx + items_per_sample
-    sample = all_sampled_items[start_idx:end_idx]
-    samples.append(sample)
-
-# Save each sample to a separate JSON file
-for i, sample in enumerate(samples, 1):
-    output_file = f"sample_{i}.json"
-    
-    # Convert back to dictionary if original data was a dictionary
-    if isinstance(data, dict):
-        sample_dict = dict(sample)
-        output_data = sample_dict
+def merge_samples(results, capacity):
+    """Merge per-file reservoirs into capacity lowest-priority distinct dialogues per stratum."""
+    counts = Counter()
+    merged = {}
+    for file_counts, reservoirs in results:
+        counts.update(file_counts)
+        for stratum, entries in reservoirs.items():
+            merged.setdefault(stratum, []).extend(entries)
+
+    seen = set()
+    for stratum in merged:
+        entries = []
+        # A dialogue ID found in several files is kept once, from the first file
+        for entry in sorted(merged[stratum]):
+            if entry[2] not in seen and len(entries) < capacity:
+                seen.add(entry[2])
+                entries.append(entry)
+        merged[stratum] = entries
+    return counts, merged
+
+
+def allocate(total, population, available):
+    """Split total across strata in proportion to their population (largest remainder), capped by what was kept."""
+    size = sum(population[stratum] for stratum in available)
+    quotas = {stratum: total * population[stratum] / size for stratum in available}
+    allocation = {stratum: min(int(quota), available[stratum]) for stratum, quota in quotas.items()}
+
+    remaining = total - sum(allocation.values())
+    order = sorted(quotas, key=lambda s: quotas[s] - int(quotas[s]), reverse=True)
+    while remaining > 0:
+        for stratum in order:
+            if remaining > 0 and allocation[stratum] < available[stratum]:
+                allocation[stratum] += 1
+                remaining -= 1
+    return allocation
+
+
+def deal(selected, annotators, per_annotator):
+    """Hand out the selected dialogues round-robin so every annotator gets a share of each stratum."""
+    samples = [[] for _ in range(annotators)]
+    for position, entry in enumerate(selected[:annotators * per_annotator]):
+        samples[position % annotators].append(entry)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input_files", nargs="+", help="guide JSON files to sample from")
+    parser.add_argument("--annotators", type=int, default=4, help="number of sample files to write")
+    parser.add_argument("--per-annotator", type=int, default=9, help="dialogues per sample file")
+    parser.add_argument("--stratify", nargs="*", default=[], choices=["split", "intent"],
+                        help="sample proportionally within these strata")
+    parser.add_argument("--seed", type=int, help="random seed (default: a new one, printed for reruns)")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (default: one per file, up to the CPU count)")
+    parser.add_argument("--output-dir", default=".", help="directory for the sample files")
+    parser.add_argument("--prefix", default="sample_", help="sample file name prefix")
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    print(f"Seed: {seed}")
+    total_needed = args.annotators * args.per_annotator
+
+    workers = args.workers or min(len(args.input_files), os.cpu_count() or 1)
+    jobs = [(index, path, seed, total_needed, args.stratify) for index, path in enumerate(args.input_files)]
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(sample_file, *zip(*jobs)))
     else:
-        output_data = sample
-    
-    with open(output_file, 'w', encoding='utf-8-sig') as f:
-        json.dump(output_data, f, ensure_ascii=False, indent=2)
-    
-    print(f"Saved {len(sample)} items to {output_file} (no duplicates between samples)") 
\ No newline at end of file
+        results = [sample_file(*job) for job in jobs]
+
+    counts, reservoirs = merge_samples(results, total_needed)
+    available = {stratum: len(entries) for stratum, entries in reservoirs.items()}
+    available_items = sum(available.values())
+    print(f"Total items needed: {total_needed}, "
+          f"Available items: {sum(counts.values())} in {len(args.input_files)} file(s)")
+
+    annotators, per_annotator = args.annotators, args.per_annotator
+    if available_items < total_needed:
+        annotators = min(args.annotators, available_items // per_annotator)
+        print(f"Warning: Not enough items. Can only create {annotators} complete samples of {per_annotator} items each.")
+        total_needed = annotators * per_annotator
+
+    allocation = allocate(total_needed, counts, available) if total_needed else {}
+    selected = []
+    for stratum in sorted(allocation):
+        if args.stratify:
+            print(f"  {stratum}: {allocation[stratum]} of {counts[stratum]}")
+        selected.extend(reservoirs[stratum][:allocation[stratum]])
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for i, sample in enumerate(deal(selected, annotators, per_annotator), 1):
+        output_file = output_dir / f"{args.prefix}{i}.json"
+        output_data = {dialogue_id: record for _, _, dialogue_id, record in sample}
+        with open(output_file, 'w', encoding='utf-8-sig') as f:
+            json.dump(output_data, f, ensure_ascii=False, indent=2)
+        print(f"Saved {len(sample)} items to {output_file} (no duplicates between samples)")
+
+
+if __name__ == "__main__":
+    main()
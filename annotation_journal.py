@@ -0,0 +1,312 @@
+"""Append-only journal of dialogue_history updates for guide files.
+
+Saves append one JSON line to <guide file>.journal.jsonl and fsync it instead
+of rewriting the whole guide JSON. Readers overlay the journal on the base
+file; compaction merges it back into the guide JSON atomically.
+CompactionWriter runs compactions in a background thread, so the updates
+saved to one file within a short window cost a single rewrite.
+
+Appends hold an exclusive lock on the guide file, both within the process
+and, where fcntl is available, across processes through <guide file>.lock,
+so workers of a multi-process server never interleave. A compaction holds
+that lock only to rename the journal to <guide file>.journal.jsonl.compacting;
+it parses and rewrites the guide JSON under a separate lock
+(<guide file>.compact.lock) while saves go on appending to a new journal.
+Until the rewrite is done, readers overlay the renamed journal and then the
+new one.
+
+    python annotation_journal.py compact TACT_interraction_datas/multiwoz/*.json
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only cover threads of one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = '.journal.jsonl'
+COMPACTING_SUFFIX = JOURNAL_SUFFIX + '.compacting'
+LOCK_SUFFIX = '.lock'
+COMPACT_LOCK_SUFFIX = '.compact.lock'
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+# Read once: os.umask() can only be read by setting it, which would race with other threads
+_umask = os.umask(0)
+os.umask(_umask)
+
+
+def journal_path(guide_path):
+    return Path(str(guide_path) + JOURNAL_SUFFIX)
+
+
+def compacting_path(guide_path):
+    return Path(str(guide_path) + COMPACTING_SUFFIX)
+
+
+def lock_path(guide_path):
+    return Path(str(guide_path) + LOCK_SUFFIX)
+
+
+@contextmanager
+def _exclusive(path):
+    key = os.path.abspath(path)
+    with _locks_guard:
+        thread_lock = _locks.setdefault(key, threading.Lock())
+
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        # flock is per open file, so other processes wait here while this one holds it
+        with open(path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+# One lock per guide file so appends never interleave with the journal rename of a compaction
+def guide_lock(guide_path):
+    return _exclusive(lock_path(guide_path))
+
+
+# One compaction of a guide file at a time; appends do not wait for it
+def compaction_lock(guide_path):
+    return _exclusive(Path(str(guide_path) + COMPACT_LOCK_SUFFIX))
+
+
+def append_update(guide_path, dialogue_id, dialogue_history):
+    """Durably record a dialogue_history update for one dialogue."""
+    line = json.dumps({
+        "id": dialogue_id,
+        "dialogue_history": dialogue_history,
+        "saved_at": time.time()
+    }, ensure_ascii=False) + "\n"
+
+    with guide_lock(guide_path):
+        with open(journal_path(guide_path), 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def read_updates(guide_path, offset=0):
+    """Return (updates, end_offset) for complete journal lines after offset.
+
+    A trailing line without a newline (an append cut short by a crash) is
+    left unread.
+    """
+    return _read_lines(journal_path(guide_path), offset)
+
+
+def read_compacting_updates(guide_path, offset=0):
+    """Like read_updates(), for the journal a running compaction is merging.
+
+    These updates are older than any in the journal, so apply them first.
+    """
+    return _read_lines(compacting_path(guide_path), offset)
+
+
+def _read_lines(path, offset):
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            chunk = f.read()
+    except FileNotFoundError:
+        return [], 0
+
+    end = chunk.rfind(b'\n') + 1
+    updates = []
+    for line in chunk[:end].splitlines():
+        if line.strip():
+            try:
+                updates.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return updates, offset + end
+
+
+def apply_updates(data, updates):
+    """Overlay journaled updates on parsed guide data (dict-like, keyed by dialogue ID)."""
+    for update in updates:
+        dialogue_id = update.get("id")
+        if dialogue_id in data:
+            record = data[dialogue_id]
+            record["dialogue_history"] = update["dialogue_history"]
+            data[dialogue_id] = record
+
+
+def copy_mode(tmp_path, path):
+    """Give tmp_path the mode of path, or that of a newly created file if path does not exist.
+
+    mkstemp creates files as 0600, and os.replace keeps the mode of the file
+    moved into place.
+    """
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o666 & ~_umask
+    os.chmod(tmp_path, mode)
+
+
+def write_json_atomic(path, data, indent=2):
+    """Write JSON next to path and rename it into place so readers never see a partial file."""
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=path.name + '.', suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8-sig') as f:
+            json.dump(data, f, indent=indent, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        copy_mode(tmp_path, path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    # Persist the rename itself
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def compact(guide_path):
+    """Merge the journal into the guide JSON; returns the number of updates applied."""
+    with compaction_lock(guide_path):
+        pending = compacting_path(guide_path)
+        count = 0
+        if pending.exists():
+            # Left by a compaction that failed or was interrupted before it finished
+            count += _merge(guide_path, pending)
+        with guide_lock(guide_path):
+            try:
+                os.replace(journal_path(guide_path), pending)
+            except FileNotFoundError:
+                return count
+        return count + _merge(guide_path, pending)
+
+
+def _merge(guide_path, pending):
+    updates, _ = read_compacting_updates(guide_path)
+    if updates:
+        with open(guide_path, 'r', encoding='utf-8-sig') as f:
+            data = json.load(f)
+        apply_updates(data, updates)
+        write_json_atomic(guide_path, data)
+    # The base file now holds every update of the renamed journal
+    pending.unlink()
+    return len(updates)
+
+
+class CompactionWriter:
+    """Compacts guide files in a background thread, coalescing the updates to each file.
+
+    schedule() is called after an update has been journaled. The file is
+    compacted delay seconds after the first update scheduled since its last
+    compaction, so every update saved in that window is merged in one atomic
+    rewrite. The thread is started on first use.
+    """
+
+    def __init__(self, delay=2.0):
+        self.delay = delay
+        self.compactions = 0
+        self.updates_merged = 0
+        self._due = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def schedule(self, guide_path):
+        with self._condition:
+            key = os.path.abspath(guide_path)
+            # Later updates join the pending compaction rather than postponing it
+            self._due.setdefault(key, time.monotonic() + self.delay)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="journal-compaction", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def pending(self):
+        with self._condition:
+            return len(self._due)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._due and not self._stopping:
+                    self._condition.wait()
+                if not self._due:
+                    return
+                key, due = min(self._due.items(), key=lambda item: item[1])
+                wait = due - time.monotonic()
+                if wait > 0 and not self._stopping:
+                    self._condition.wait(wait)
+                    continue
+                del self._due[key]
+            self._compact(key)
+
+    def _compact(self, guide_path):
+        try:
+            count = compact(guide_path)
+        except Exception as e:
+            # The updates stay in the journal; the next save schedules another attempt
+            logger.error("Error compacting %s: %s", guide_path, e)
+            return
+        if count:
+            self.compactions += 1
+            self.updates_merged += count
+            logger.info("Merged %d update(s) into %s", count, guide_path)
+
+    def flush(self):
+        """Compact every pending file now, in the calling thread."""
+        with self._condition:
+            keys = list(self._due)
+            self._due.clear()
+        for key in keys:
+            self._compact(key)
+
+    def stop(self):
+        """Compact what is pending and stop the thread."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser("compact", help="merge journals back into their guide files")
+    compact_parser.add_argument("guide_files", nargs="*",
+                                help="guide JSON files (default: every guide with a journal under TACT_interraction_datas)")
+    args = parser.parse_args()
+
+    guide_files = args.guide_files or [
+        str(path)[:-len(JOURNAL_SUFFIX)]
+        for path in sorted(Path("TACT_interraction_datas").glob("*/*" + JOURNAL_SUFFIX))
+    ]
+    for guide_file in guide_files:
+        count = compact(guide_file)
+        print(f"{guide_file}: merged {count} update(s)")
+
+
+if __name__ == "__main__":
+    main()
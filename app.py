@@ -1,26 +1,44 @@
-from flask import Flask, render_template, request, jsonify, session
-import openai
+from flask import Blueprint, Flask, render_template, request, jsonify, session, Response, stream_with_context, g
+import atexit
+import gc
 import os
 import json
-import re
+import logging
+import threading
+import time
+import uuid
 from dotenv import load_dotenv
 from pathlib import Path
+from dialogue_resolver import DialogueIdResolver
+from history_store import create_history_store
+from annotation_journal import (CompactionWriter, append_update, apply_updates, compacting_path, journal_path,
+                                read_compacting_updates, read_updates)
+from completion_cache import CompletionCache, completion_key, is_deterministic
+from prompt_budget import SummaryCache, fit_messages
+from guide_reader import IndexedGuide
+from guide_snapshot import load_snapshot
+from turn_parser import DialogueTurns, TurnCache
+from dataset_registry import DatasetRegistry
+import corpus_stats
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Registry
+from logging_config import configure_logging
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Get API key and print debug info (without exposing the full key)
+# Log through a queue so request threads never block on stderr
+configure_logging(os.getenv("LOG_LEVEL", "INFO").upper())
+logger = logging.getLogger("app")
+
+# Get API key and log debug info (without exposing the full key)
 api_key = os.getenv("OPENAI_API_KEY")
 if api_key:
-    print(f"API key found: {api_key[:8]}...{api_key[-4:]}")
+    logger.info("API key found: %s...%s", api_key[:8], api_key[-4:])
 else:
-    print("WARNING: No OpenAI API key found in environment variables!")
-
-app = Flask(__name__)
-app.secret_key = os.getenv("SECRET_KEY", "default-secret-key")
+    logger.warning("No OpenAI API key found in environment variables!")
 
-# Initialize OpenAI client
-client = openai.OpenAI(api_key=api_key)
+# All routes; create_app() registers them on a Flask app
+bp = Blueprint('chat', __name__)
 
 # Configuration settings
 CONFIG = {
@@ -28,14 +46,120 @@ CONFIG = {
     "max_tokens": int(os.getenv("MAX_TOKENS", "1000")),
     "temperature": float(os.getenv("TEMPERATURE", "0")),
     "top_p": float(os.getenv("TOP_P", "0")),
-    "data_dir": os.getenv("DATA_DIR", "TACT_interraction_datas/multiwoz"),
-    "main_data_file": os.getenv("MAIN_DATA_FILE", "TACT_MultiWOZ_yjyoon_guide.json"),
-    "alternative_data_files": [
-        "TACT_MultiWOZ_nyso_guide.json",
-        "TACT_MultiWOZ_yjyoon_guide.json.json"
-    ]
+    # Every subdirectory of DATA_ROOT is a dataset of guide files; requests pick one with ?dataset=
+    "data_root": os.getenv("DATA_ROOT", "TACT_interraction_datas"),
+    "default_dataset": os.getenv("DEFAULT_DATASET", "multiwoz"),
+    # Index all datasets in a background thread at startup instead of on first request
+    "background_index": os.getenv("BACKGROUND_INDEX", "true").lower() in ["true", "1", "yes"],
+    # Index all datasets before serving and freeze them out of the garbage collector,
+    # so workers forked afterwards (gunicorn --preload) share the indexes copy-on-write
+    "preload_corpus": os.getenv("PRELOAD_CORPUS", "false").lower() in ["true", "1", "yes"],
+    # Seconds after a save before its journal is merged into the guide file (0: leave it to the CLI)
+    "compact_delay": float(os.getenv("COMPACT_DELAY", "2.0")),
+    # Seconds between mtime/size checks of cached corpus files
+    "corpus_check_interval": float(os.getenv("CORPUS_CHECK_INTERVAL", "1.0")),
+    # Read guide files through a byte-offset index and parse dialogues on lookup
+    # instead of json.load-ing the whole file
+    "lazy_corpus": os.getenv("LAZY_CORPUS", "true").lower() in ["true", "1", "yes"],
+    # Read guide files through memory-mapped binary snapshots (<guide file>.snap), rebuilt
+    # whenever the guide JSON changes; takes precedence over lazy_corpus
+    "corpus_snapshot": os.getenv("CORPUS_SNAPSHOT", "false").lower() in ["true", "1", "yes"],
+    # Turns of the selected dialogue shown as sample dialogs
+    "max_sample_turns": int(os.getenv("MAX_SAMPLE_TURNS", "3")),
+    # Largest page of dialogue IDs returned by /api/dialogues
+    "dialogue_page_limit": int(os.getenv("DIALOGUE_PAGE_LIMIT", "200")),
+    # OpenAI endpoint and HTTP connection pool (shared by the sync and async clients)
+    "openai_base_url": os.getenv("OPENAI_BASE_URL") or None,
+    "http_max_connections": int(os.getenv("HTTP_MAX_CONNECTIONS", "200")),
+    "http_max_keepalive": int(os.getenv("HTTP_MAX_KEEPALIVE", "50")),
+    "http_keepalive_expiry": float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30")),
+    "http_connect_timeout": float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+    "http_read_timeout": float(os.getenv("HTTP_READ_TIMEOUT", "120")),
+    "http_pool_shards": int(os.getenv("HTTP_POOL_SHARDS", "8")),
+    # Dialog history storage: "tiered" (LRU + SQLite), "sqlite" or "memory"
+    "history_store": os.getenv("HISTORY_STORE", "tiered"),
+    "history_db_path": os.getenv("HISTORY_DB_PATH", "chat_history.sqlite3"),
+    "history_cache_size": int(os.getenv("HISTORY_CACHE_SIZE", "1000")),
+    # Opt-in cache of completions; only used when temperature and top_p are both 0
+    "completion_cache": os.getenv("COMPLETION_CACHE", "false").lower() in ["true", "1", "yes"],
+    "completion_cache_path": os.getenv("COMPLETION_CACHE_PATH", "completion_cache.sqlite3"),
+    "completion_cache_size": int(os.getenv("COMPLETION_CACHE_SIZE", "1024")),
+    "completion_cache_ttl": float(os.getenv("COMPLETION_CACHE_TTL", str(7 * 24 * 3600))),
+    "completion_cache_max_bytes": int(os.getenv("COMPLETION_CACHE_MAX_BYTES", str(100 * 1024 * 1024))),
+    # Prompt budget: older turns beyond this many tokens are dropped (or summarized)
+    "max_prompt_tokens": int(os.getenv("MAX_PROMPT_TOKENS", "16000")),
+    "history_summary": os.getenv("HISTORY_SUMMARY", "false").lower() in ["true", "1", "yes"],
+    "summary_max_tokens": int(os.getenv("SUMMARY_MAX_TOKENS", "300")),
+    # Ask for token usage on streamed completions (stream_options.include_usage)
+    "stream_usage": os.getenv("STREAM_USAGE", "true").lower() in ["true", "1", "yes"]
 }
 
+# OpenAI client, created on first use: importing openai takes most of the app's import time,
+# and with a preloading server each worker then opens its own connection pool
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from llm_client import create_openai_client
+                _client = create_openai_client(CONFIG, api_key)
+    return _client
+
+# Per-process metrics, served in Prometheus text format at /metrics
+metrics_registry = Registry()
+request_latency = metrics_registry.histogram(
+    "http_request_duration_seconds", "Time to response headers by route", ["route", "method", "status"])
+openai_latency = metrics_registry.histogram(
+    "openai_request_duration_seconds", "Duration of OpenAI chat completion calls", ["endpoint"])
+openai_ttft = metrics_registry.histogram(
+    "openai_time_to_first_token_seconds", "Time to the first streamed token from OpenAI", ["endpoint"])
+openai_tokens = metrics_registry.counter(
+    "openai_tokens_total", "Tokens reported in OpenAI response usage", ["endpoint", "kind"])
+openai_errors = metrics_registry.counter(
+    "openai_errors_total", "Failed OpenAI chat completion calls", ["endpoint"])
+corpus_load_latency = metrics_registry.histogram(
+    "corpus_load_seconds", "Guide file load and parse time (kind=journal: journal tail only)", ["file", "kind"])
+cache_requests = metrics_registry.counter(
+    "cache_requests_total", "Cache lookups by cache and result", ["cache", "result"])
+journal_compactions = metrics_registry.counter(
+    "journal_compactions_total", "Guide file rewrites merging saved histories")
+journal_updates_merged = metrics_registry.counter(
+    "journal_updates_merged_total", "Saved histories merged into guide files")
+
+# Record one OpenAI call; endpoint is "chat", "stream" or "summary"
+def record_openai_call(endpoint, seconds, usage=None, ttft=None):
+    openai_latency.observe(seconds, endpoint=endpoint)
+    if ttft is not None:
+        openai_ttft.observe(ttft, endpoint=endpoint)
+    if usage:
+        # Streamed usage arrives as a plain dict on older openai versions
+        if isinstance(usage, dict):
+            prompt_tokens, completion_tokens = usage.get("prompt_tokens"), usage.get("completion_tokens")
+        else:
+            prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+        openai_tokens.inc(prompt_tokens or 0, endpoint=endpoint, kind="prompt")
+        openai_tokens.inc(completion_tokens or 0, endpoint=endpoint, kind="completion")
+
+# Extra request options for streamed completions
+def stream_options():
+    return {"extra_body": {"stream_options": {"include_usage": True}}} if CONFIG["stream_usage"] else {}
+
+@bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@bp.after_app_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        request_latency.observe(time.perf_counter() - started,
+                                route=route, method=request.method, status=response.status_code)
+    return response
+
 # Load sample data if needed (fallback when file loading fails)
 def load_sample_data():
     sample_file = os.getenv("SAMPLE_DATA_FILE", "sample_data.json")
@@ -46,118 +170,236 @@ def load_sample_data():
             with open(sample_path, 'r', encoding='utf-8-sig') as f:
                 return json.load(f)
         except Exception as e:
-            print(f"Error loading sample data file: {str(e)}")
+            logger.error("Error loading sample data file: %s", e)
     
     # Return empty dictionary if no sample data available
     return {}
 
-# Sample data as fallback
-SAMPLE_DATA = load_sample_data()
+# Sample data as fallback, read on first use
+_sample_data = None
+_sample_index = None
+_sample_lock = threading.Lock()
 
-# Load JSON file and extract available dialogue IDs
-def load_json_data_and_extract_ids():
-    dialogue_ids = []
-    
-    # Helper function to process a single file
-    def process_file(file_path):
-        file_dialogue_ids = []
-        try:
-            if file_path.exists():
-                try:
-                    with open(file_path, 'r', encoding='utf-8-sig') as f:
-                        try:
+def get_sample_data():
+    global _sample_data
+    with _sample_lock:
+        if _sample_data is None:
+            _sample_data = load_sample_data()
+        return _sample_data
+
+# Process-wide corpus cache: file path -> parsed data with its annotation journal
+# overlaid, invalidated by mtime/size of the guide file and of the journal.
+# Full loads run outside _corpus_lock under a per-file build lock.
+_corpus_lock = threading.RLock()
+_corpus_build_locks = {}
+_corpus_files = {}
+_corpus_generation = 0
+
+# A forked child gets the locks in whatever state the indexing thread left them
+def _reset_corpus_lock():
+    global _corpus_lock, _corpus_build_locks
+    _corpus_lock = threading.RLock()
+    _corpus_build_locks = {}
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_corpus_lock)
+
+def _file_signature(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+# Return the parsed contents of a guide file, re-parsing only when it changed on disk
+def load_corpus_file(file_path):
+    return _load_corpus_entry(file_path)['data']
+
+# Cache entry of a guide file, brought up to date with the file and its journal
+def _load_corpus_entry(file_path):
+    global _corpus_generation
+    key = str(file_path)
+    now = time.monotonic()
+    
+    with _corpus_lock:
+        entry = _corpus_files.get(key)
+        if entry and now - entry['checked_at'] < CONFIG["corpus_check_interval"]:
+            return entry
+        
+        signature = _file_signature(key)
+        journal_signature = _file_signature(journal_path(key))
+        compacting_signature = _file_signature(compacting_path(key))
+        if entry and entry['signature'] == signature and entry['data'] is not None:
+            if entry['compacting_signature'] != compacting_signature:
+                if compacting_signature is None:
+                    # Compaction finished; its updates are in the base file or already overlaid
+                    entry['compacting_signature'] = None
+                elif compacting_signature[1] >= entry['journal_offset']:
+                    # The journal was renamed for compaction: read on in the renamed file,
+                    # then the new journal from its start
+                    with corpus_load_latency.time(file=Path(key).name, kind="journal"):
+                        updates, _ = read_compacting_updates(key, entry['journal_offset'])
+                        apply_updates(entry['data'], updates)
+                    entry['compacting_signature'] = compacting_signature
+                    entry['journal_signature'] = None
+                    entry['journal_offset'] = 0
+            if entry['journal_signature'] != journal_signature:
+                # Journal appended to: overlay only the new lines.
+                # A journal that shrank otherwise is reloaded in full below.
+                if journal_signature and journal_signature[1] >= entry['journal_offset']:
+                    with corpus_load_latency.time(file=Path(key).name, kind="journal"):
+                        updates, entry['journal_offset'] = read_updates(key, entry['journal_offset'])
+                        apply_updates(entry['data'], updates)
+                    entry['journal_signature'] = journal_signature
+            if (entry['journal_signature'], entry['compacting_signature']) == (journal_signature, compacting_signature):
+                entry['checked_at'] = now
+                return entry
+        build_lock = _corpus_build_locks.setdefault(key, threading.Lock())
+    
+    # While another thread rebuilds this file, keep serving the previous version
+    if not build_lock.acquire(blocking=False):
+        if entry and entry['data'] is not None:
+            return entry
+        build_lock.acquire()
+    try:
+        with _corpus_lock:
+            current = _corpus_files.get(key)
+            if current is not entry:
+                # Loaded by another thread while this one waited
+                return current
+        
+        data = None
+        journal_offset = 0
+        if signature is not None:
+            try:
+                with corpus_load_latency.time(file=Path(key).name, kind="full"):
+                    if CONFIG["corpus_snapshot"]:
+                        data = load_snapshot(key)
+                    elif CONFIG["lazy_corpus"]:
+                        data = IndexedGuide(key)
+                    else:
+                        with open(key, 'r', encoding='utf-8-sig') as f:
                             data = json.load(f)
-                            for dialogue_id in data.keys():
-                                # Keep the original dialogue ID with .json extension
-                                file_dialogue_ids.append({
-                                    'id': dialogue_id,
-                                    'file_path': str(file_path),
-                                    'file_name': file_path.name
-                                })
-                            print(f"Successfully loaded {len(file_dialogue_ids)} dialogue IDs from {file_path}")
-                        except json.JSONDecodeError as e:
-                            print(f"JSON decode error in {file_path}: {str(e)}")
-                except Exception as e:
-                    print(f"Error loading file {file_path}: {str(e)}")
-        except Exception as e:
-            print(f"Error during file loading: {str(e)}")
-        return file_dialogue_ids
-    
-    # First try the main file
-    main_file_path = Path(os.path.join(CONFIG["data_dir"], CONFIG["main_data_file"]))
-    dialogue_ids.extend(process_file(main_file_path))
-    
-    # If we didn't find any dialogue IDs, try the alternative files
-    if not dialogue_ids:
-        for alt_file in CONFIG["alternative_data_files"]:
-            alt_file_path = Path(os.path.join(CONFIG["data_dir"], alt_file))
-            file_ids = process_file(alt_file_path)
-            dialogue_ids.extend(file_ids)
-            if file_ids:  # If we found IDs, no need to check more files
-                break
-    
-    # If no IDs were loaded, use sample data
-    if not dialogue_ids and SAMPLE_DATA:
-        print("Using sample data")
-        for dialogue_id in SAMPLE_DATA.keys():
-            # Keep original dialogue ID format for sample data
-            dialogue_ids.append({
-                'id': dialogue_id,
-                'file_path': 'sample_data',
-                'file_name': 'Sample Data'
-            })
-    
-    print(f"Total dialogue IDs available: {len(dialogue_ids)}")
-    return dialogue_ids
-
-# Get data for a specific dialogue ID
-def get_dialogue_data(dialogue_id, file_path):
+                    # The journal is read first: if it is renamed for compaction in between,
+                    # its lines are read again from the renamed file, which is applied first
+                    updates, journal_offset = read_updates(key)
+                    apply_updates(data, read_compacting_updates(key)[0])
+                    apply_updates(data, updates)
+                logger.info("Loaded %d dialogues from %s", len(data), key)
+            except ValueError as e:
+                logger.error("JSON decode error in %s: %s", key, e)
+            except Exception as e:
+                logger.error("Error loading file %s: %s", key, e)
+        
+        with _corpus_lock:
+            _corpus_generation += 1
+            entry = _corpus_files[key] = {
+                'signature': signature,
+                'journal_signature': journal_signature,
+                'compacting_signature': compacting_signature,
+                'journal_offset': journal_offset,
+                'checked_at': now,
+                'generation': _corpus_generation,
+                'data': data
+            }
+            return entry
+    finally:
+        build_lock.release()
+
+# (data, generation) of a guide file, for the dataset registry
+def load_corpus_version(file_path):
+    entry = _load_corpus_entry(file_path)
+    return entry['data'], entry['generation']
+
+# Make the next lookup re-check a file on disk instead of waiting for the check interval
+def expire_corpus_file(file_path):
+    with _corpus_lock:
+        entry = _corpus_files.get(str(file_path))
+        if entry:
+            entry['checked_at'] = float('-inf')
+
+# Dialogue ID indexes of the datasets under data_root
+dataset_registry = DatasetRegistry(CONFIG["data_root"], load_corpus_version,
+                                   default=CONFIG["default_dataset"],
+                                   check_interval=CONFIG["corpus_check_interval"])
+
+# Index used when no guide files are found: the sample data
+def get_sample_index():
+    global _sample_index
+    sample_data = get_sample_data()
+    with _sample_lock:
+        if _sample_index is None:
+            index = {"name": None, "dialogue_ids": [], "by_id": {}, "search": None, "lock": threading.Lock()}
+            for dialogue_id in sample_data:
+                # Keep original dialogue ID format for sample data
+                index['by_id'][dialogue_id] = {
+                    'id': dialogue_id,
+                    'file_path': 'sample_data',
+                    'file_name': 'Sample Data',
+                    'dataset': None
+                }
+                index['dialogue_ids'].append(index['by_id'][dialogue_id])
+            _sample_index = index
+        return _sample_index
+
+# Dialogue ID index of a dataset (default: the default dataset); KeyError for an unknown name
+def get_corpus_index(dataset=None):
+    if not dataset_registry.names() and not dataset:
+        return get_sample_index()
+    index = dataset_registry.get(dataset)
+    if not index['dialogue_ids'] and get_sample_data():
+        logger.debug("Using sample data")
+        return get_sample_index()
+    return index
+
+# Case-insensitive ID search over a dataset's index, built on first use.
+# Returns (dialogue_ids, search) from the same index build so ordinals line up.
+def get_dialogue_search(dataset=None):
+    corpus_index = get_corpus_index(dataset)
+    with corpus_index['lock']:
+        if corpus_index['search'] is None:
+            corpus_index['search'] = DialogueIdResolver(d['id'].lower() for d in corpus_index['dialogue_ids'])
+        return corpus_index['dialogue_ids'], corpus_index['search']
+
+# The dataset named in the request (query string or JSON body), if it exists
+def requested_dataset(name):
+    return name if name and name in dataset_registry else None
+
+# Load JSON file and extract available dialogue IDs
+def load_json_data_and_extract_ids(dataset=None):
+    return get_corpus_index(dataset)['dialogue_ids']
+
+# Get data for a specific dialogue ID; an ID not in file_path is looked up in the
+# dataset index (of file_path's dataset unless one is given), never by probing files
+def get_dialogue_data(dialogue_id, file_path, dataset=None):
     # Try to get data from the sample data first for quick testing
-    if SAMPLE_DATA:
+    sample_data = get_sample_data()
+    if sample_data:
         # Try with the exact ID first
-        if dialogue_id in SAMPLE_DATA:
-            print(f"Using sample data for {dialogue_id}")
-            return SAMPLE_DATA[dialogue_id], True
+        if dialogue_id in sample_data:
+            logger.debug("Using sample data for %s", dialogue_id)
+            return sample_data[dialogue_id], True
         
         # If the ID doesn't have .json extension, try adding it
-        if not dialogue_id.endswith('.json') and dialogue_id + '.json' in SAMPLE_DATA:
-            print(f"Using sample data for {dialogue_id}.json")
-            return SAMPLE_DATA[dialogue_id + '.json'], True
+        if not dialogue_id.endswith('.json') and dialogue_id + '.json' in sample_data:
+            logger.debug("Using sample data for %s.json", dialogue_id)
+            return sample_data[dialogue_id + '.json'], True
     
     # Function to try loading data from a specific file
     def try_file(path, id):
         if path == 'sample_data' or not Path(path).exists():
             return None, False
         
-        try:
-            with open(path, 'r', encoding='utf-8-sig') as f:
-                data = json.load(f)
-                
-                # Try exact match
-                if id in data:
-                    dialogue_data = data[id]
-                    if "guideline" in dialogue_data and "generated_data" in dialogue_data:
-                        print(f"Found dialogue {id} in {path}")
-                        return dialogue_data, True
-                
-                # Try with .json extension
-                id_with_json = id if id.endswith('.json') else id + '.json'
-                if id_with_json in data:
-                    dialogue_data = data[id_with_json]
-                    if "guideline" in dialogue_data and "generated_data" in dialogue_data:
-                        print(f"Found dialogue {id_with_json} in {path}")
-                        return dialogue_data, True
-                
-                # Try approximate matching
-                possible_matches = [k for k in data.keys() if id.replace('.json', '') in k or k.replace('.json', '') in id]
-                if possible_matches:
-                    match_id = possible_matches[0]
-                    dialogue_data = data[match_id]
-                    if "guideline" in dialogue_data and "generated_data" in dialogue_data:
-                        print(f"Found similar dialogue {match_id} in {path}")
-                        return dialogue_data, True
-        except Exception as e:
-            print(f"Error reading file {path}: {str(e)}")
+        data = load_corpus_file(path)
+        if not data:
+            return None, False
+        
+        # Try exact match, then with .json extension
+        for candidate in (id, id if id.endswith('.json') else id + '.json'):
+            if candidate in data:
+                dialogue_data = data[candidate]
+                if "guideline" in dialogue_data and "generated_data" in dialogue_data:
+                    return dialogue_data, True
         
         return None, False
     
@@ -166,30 +408,24 @@ def get_dialogue_data(dialogue_id, file_path):
     if success:
         return result, success
     
-    # If not found and file_path is not from sample data, try alternative files
+    # Then the file the dataset index points to, matching approximately if needed
     if file_path != 'sample_data':
-        data_dir = CONFIG["data_dir"]
-        
-        # First try main data file if it's different from the specified file
-        main_file_path = os.path.join(data_dir, CONFIG["main_data_file"])
-        if main_file_path != file_path:
-            result, success = try_file(main_file_path, dialogue_id)
+        try:
+            entry = dataset_registry.locate(dialogue_id, dataset or dataset_registry.dataset_of(file_path))
+        except KeyError:
+            entry = None
+        if entry and (entry['file_path'], entry['id']) != (str(file_path), dialogue_id):
+            result, success = try_file(entry['file_path'], entry['id'])
             if success:
+                if entry['id'] != dialogue_id:
+                    logger.info("Found similar dialogue %s in %s", entry['id'], entry['file_path'])
                 return result, success
-        
-        # Then try alternative files
-        for alt_file in CONFIG["alternative_data_files"]:
-            alt_file_path = os.path.join(data_dir, alt_file)
-            if alt_file_path != file_path:  # Don't retry the same file
-                result, success = try_file(alt_file_path, dialogue_id)
-                if success:
-                    return result, success
     
     # Fallback to first available dialogue in sample data if dialogue ID is not found
-    if SAMPLE_DATA and len(SAMPLE_DATA) > 0:
-        first_key = next(iter(SAMPLE_DATA))
-        print(f"Using default sample data for {first_key}")
-        return SAMPLE_DATA[first_key], False
+    if sample_data:
+        first_key = next(iter(sample_data))
+        logger.info("Using default sample data for %s", first_key)
+        return sample_data[first_key], False
     else:
         # Ultimate fallback
         return {
@@ -197,63 +433,168 @@ def get_dialogue_data(dialogue_id, file_path):
             "generated_data": ""
         }, False
 
+# Corpus statistics per dataset, kept until a guide file or its journal changes
+stats_cache = corpus_stats.StatsCache()
+
+def get_corpus_stats(dataset):
+    index = dataset_registry.get(dataset)
+    entries = [(path, _load_corpus_entry(path)) for path in index['files']]
+    guides = [(Path(path).name, entry['data']) for path, entry in entries]
+    # Saves overlay the journal in place without a new generation, so the journal counts too
+    with _corpus_lock:
+        version = tuple((path, entry['generation'], entry['journal_signature']) for path, entry in entries)
+    return stats_cache.get_or_compute(dataset, version, lambda: corpus_stats.compute(guides))
+
+# Parsed generated_data transcripts, reused across page renders
+turn_cache = TurnCache()
+
+# Parsed turns of a dialogue; memoized per (file, dialogue ID, mtime) when the source file is known
+def get_dialogue_turns(data_string, file_path=None, dialogue_id=None):
+    if file_path is None or dialogue_id is None:
+        return DialogueTurns(data_string)
+    entry = _corpus_files.get(str(file_path))
+    mtime = entry['signature'][0] if entry and entry['signature'] else None
+    return turn_cache.get((str(file_path), dialogue_id, mtime), data_string)
+
 # Extract and format example dialogs
-def extract_sample_dialogs(data_string):
-    lines = data_string.strip().split('\n')
+def extract_sample_dialogs(data_string, file_path=None, dialogue_id=None):
+    # Process the first turns as (user, system) pairs of lines
+    max_turns = CONFIG["max_sample_turns"]
+    turns = get_dialogue_turns(data_string, file_path, dialogue_id).head(max_turns * 2)
     sample_dialogs = []
     
-    # Process first three turns (pairs of lines)
-    max_turns = int(os.getenv("MAX_SAMPLE_TURNS", "3"))
-    for i in range(0, min(max_turns * 2, len(lines)), 2):
-        if i+1 < len(lines):
-            user_line = lines[i]
-            system_line = lines[i+1]
-            
-            # Extract user message (remove turn number and tags)
-            user_match = re.search(r'^\d+ \[USER\] \[[^\]]+\] (.*)', user_line)
-            user_content = user_match.group(1) if user_match else user_line
-            
-            # Extract system response (remove turn number and tags)
-            system_match = re.search(r'^\d+ \[SYSTEM\]( \[[^\]]+\])? (.*)', system_line)
-            system_content = system_match.group(2) if system_match else system_line
-            
-            sample_dialogs.append({
-                'dialogue_id': f"Turn {(i//2) + 1}",
-                'user': user_content,
-                'agent': system_content
-            })
+    for i in range(0, len(turns) - 1, 2):
+        sample_dialogs.append({
+            'dialogue_id': f"Turn {(i//2) + 1}",
+            'user': turns[i].text,
+            'agent': turns[i+1].text
+        })
     
     return sample_dialogs
 
-@app.route('/')
-def index():
-    # Initialize dialog history if it doesn't exist
-    if 'messages' not in session:
-        session['messages'] = []
-    
-    # Get list of dialogue IDs
-    dialogue_ids = load_json_data_and_extract_ids()
+# Server-side dialog histories; the session cookie only carries a session ID
+history_store = create_history_store(CONFIG)
+
+# Background merging of saved histories into the guide files
+journal_writer = None
+if CONFIG["compact_delay"] > 0:
+    journal_writer = CompactionWriter(CONFIG["compact_delay"])
+    atexit.register(journal_writer.stop)
+
+# Return the history store key for this browser session, creating it if needed.
+# session_data defaults to the Flask session; the ASGI path passes its own dict.
+def get_session_id(session_data=None):
+    if session_data is None:
+        session_data = session
+    
+    session_id = session_data.get('sid')
+    if not session_id:
+        session_id = uuid.uuid4().hex
+        session_data['sid'] = session_id
+    
+    # Move histories from cookies issued before the server-side store existed
+    legacy_messages = session_data.pop('messages', None)
+    if legacy_messages:
+        for msg in legacy_messages:
+            history_store.append(session_id, msg)
+    
+    return session_id
+
+# Cache for deterministic completions (None when disabled)
+completion_cache = None
+if CONFIG["completion_cache"] and is_deterministic(CONFIG["temperature"], CONFIG["top_p"]):
+    completion_cache = CompletionCache(
+        CONFIG["completion_cache_path"],
+        max_entries=CONFIG["completion_cache_size"],
+        ttl=CONFIG["completion_cache_ttl"],
+        max_bytes=CONFIG["completion_cache_max_bytes"]
+    )
+
+# Return (cache key, cached reply) for a prompt; the key is None when caching is off
+def lookup_completion(messages):
+    if completion_cache is None:
+        return None, None
+    key = completion_key(CONFIG["openai_model"], messages, CONFIG["temperature"],
+                         CONFIG["top_p"], CONFIG["max_tokens"])
+    cached = completion_cache.get(key)
+    cache_requests.inc(cache="completion", result="miss" if cached is None else "hit")
+    return key, cached
+
+def store_completion(key, agent_message):
+    if key is not None and agent_message:
+        completion_cache.put(key, agent_message)
+
+# Cache details reported in the chat response metadata
+def cache_metadata(key, hit):
+    if key is None:
+        return {"enabled": False}
+    stats = completion_cache.stats()
+    return {"enabled": True, "hit": hit, "hits": stats["hits"], "misses": stats["misses"]}
+
+# Create messages array for OpenAI API
+def build_chat_messages(system_prompt, history, user_prompt):
+    messages = []
     
-    # Get selected dialogue ID
-    selected_id = request.args.get('dialogue_id')
-    selected_dialogue = None
+    # Add system message at the beginning
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
     
-    # Find the selected dialogue or use the first one
-    if selected_id:
-        for dialogue in dialogue_ids:
-            if dialogue['id'] == selected_id:
-                selected_dialogue = dialogue
-                break
+    # Add accumulated dialog history
+    for msg in history:
+        messages.append({"role": msg['role'], "content": msg['content']})
     
-    if not selected_dialogue and dialogue_ids:
-        selected_dialogue = dialogue_ids[0]
-        selected_id = selected_dialogue['id']
+    # Add current user message
+    if user_prompt:
+        messages.append({"role": "user", "content": user_prompt})
     
-    # Get dialogue data
+    return messages
+
+# Summaries of dropped turns, shared by all sessions
+summary_cache = SummaryCache()
+
+# Ask the model for a short summary of turns that no longer fit in the prompt
+def summarize_history(history):
+    transcript = "\n".join(f"{msg['role'].upper()}: {msg['content']}" for msg in history)
+    started = time.perf_counter()
+    response = get_client().chat.completions.create(
+        model=CONFIG["openai_model"],
+        messages=[
+            {"role": "system", "content": "Summarize this conversation in a few sentences. Keep every fact, request and commitment the rest of the conversation may depend on."},
+            {"role": "user", "content": transcript}
+        ],
+        temperature=0,
+        max_tokens=CONFIG["summary_max_tokens"]
+    )
+    record_openai_call("summary", time.perf_counter() - started, response.usage)
+    return response.choices[0].message.content
+
+def _cached_summary(history):
+    try:
+        return summary_cache.get_or_create(history, summarize_history)
+    except Exception as e:
+        openai_errors.inc(endpoint="summary")
+        logger.error("Error summarizing history: %s", e)
+        return None
+
+# Keep the prompt within MAX_PROMPT_TOKENS; returns (messages, prompt metadata)
+def fit_prompt(messages):
+    summarize = _cached_summary if CONFIG["history_summary"] else None
+    return fit_messages(messages, CONFIG["max_prompt_tokens"], summarize)
+
+# Format one Server-Sent Events message
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# Guideline, sample turns and data source label for one entry of the corpus index
+def describe_dialogue(selected_dialogue):
     if selected_dialogue:
-        dialogue_data, success = get_dialogue_data(selected_dialogue['id'], selected_dialogue['file_path'])
+        selected_id = selected_dialogue['id']
+        file_path = selected_dialogue['file_path']
+        dialogue_data, success = get_dialogue_data(selected_id, file_path, selected_dialogue['dataset'])
         file_source = selected_dialogue['file_name']
     else:
+        selected_id = None
+        file_path = None
         dialogue_data = {"guideline": "", "generated_data": ""}
         success = False
         file_source = "No Data Available"
@@ -262,178 +603,342 @@ def index():
     guideline = dialogue_data.get("guideline", "")
     generated_data = dialogue_data.get("generated_data", "")
     
-    # Create sample dialogs
-    sample_dialogs = extract_sample_dialogs(generated_data)
+    return {
+        "id": selected_id,
+        "dataset": selected_dialogue['dataset'] if selected_dialogue else None,
+        "guideline": guideline,
+        # Create sample dialogs
+        "sample_dialogs": extract_sample_dialogs(generated_data, file_path, selected_id),
+        "data_source": f"{file_source} - {selected_id}" if success else "No valid data"
+    }
+
+@bp.route('/')
+def index():
+    # Load this session's dialog history
+    messages = history_store.get(get_session_id())
+    
+    # Get selected dataset and dialogue ID; the selector loads the ID list from /api/dialogues
+    dataset = requested_dataset(request.args.get('dataset')) or dataset_registry.default
+    corpus_index = get_corpus_index(dataset)
+    selected_id = request.args.get('dialogue_id')
+    selected_dialogue = corpus_index['by_id'].get(selected_id) if selected_id else None
+    
+    if not selected_dialogue and corpus_index['dialogue_ids']:
+        selected_dialogue = corpus_index['dialogue_ids'][0]
     
-    data_source = f"{file_source} - {selected_id}" if success else "No valid data"
+    dialogue = describe_dialogue(selected_dialogue)
     
     return render_template('index.html', 
-                          messages=session['messages'],
-                          guidelines=guideline,
-                          sample_dialogs=sample_dialogs,
-                          dialogue_ids=dialogue_ids,
-                          selected_id=selected_id,
-                          data_source=data_source)
-
-@app.route('/api/chat', methods=['POST'])
+                          messages=messages,
+                          guidelines=dialogue['guideline'],
+                          sample_dialogs=dialogue['sample_dialogs'],
+                          selected_id=dialogue['id'],
+                          datasets=dataset_registry.names(),
+                          dataset=dataset,
+                          data_source=dialogue['data_source'])
+
+@bp.route('/api/dialogues')
+def list_dialogues():
+    """One page of dialogue IDs, optionally filtered to IDs containing q (case-insensitive)."""
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(max(1, int(request.args.get('limit', 50))), CONFIG["dialogue_page_limit"])
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    query = request.args.get('q', '').strip().lower()
+    dataset = request.args.get('dataset')
+    if dataset and not requested_dataset(dataset):
+        return jsonify({"error": f"Unknown dataset {dataset}"}), 404
+    
+    if query:
+        dialogue_ids, search = get_dialogue_search(dataset)
+        total, ordinals = search.search(query, offset, limit)
+    else:
+        # Plain paging needs no search index
+        dialogue_ids = get_corpus_index(dataset)['dialogue_ids']
+        total = len(dialogue_ids)
+        ordinals = range(offset, min(total, offset + limit))
+    
+    return jsonify({
+        "dataset": dataset or dataset_registry.default,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "dialogues": [{"id": dialogue_ids[o]['id'], "file_name": dialogue_ids[o]['file_name']} for o in ordinals]
+    })
+
+@bp.route('/api/dialogues/<path:dialogue_id>')
+def dialogue_detail(dialogue_id):
+    dataset = request.args.get('dataset')
+    if dataset and not requested_dataset(dataset):
+        return jsonify({"error": f"Unknown dataset {dataset}"}), 404
+    selected_dialogue = get_corpus_index(dataset)['by_id'].get(dialogue_id)
+    if not selected_dialogue:
+        return jsonify({"error": f"Dialogue ID {dialogue_id} not found"}), 404
+    return jsonify(describe_dialogue(selected_dialogue))
+
+@bp.route('/api/chat', methods=['POST'])
 def chat():
     data = request.json
     system_prompt = data.get('system_prompt', '')
     user_prompt = data.get('user_prompt', '')
     
-    # Initialize messages if they don't exist
-    if 'messages' not in session:
-        session['messages'] = []
-    
-    # Create messages array for OpenAI API
-    messages = []
-    
-    # Add system message at the beginning
-    if system_prompt:
-        messages.append({"role": "system", "content": system_prompt})
+    session_id = get_session_id()
+    history = history_store.get(session_id)
+    messages, prompt_info = fit_prompt(build_chat_messages(system_prompt, history, user_prompt))
     
-    # Add accumulated dialog history
-    for msg in session['messages']:
-        messages.append({"role": msg['role'], "content": msg['content']})
-    
-    # Add current user message
     if user_prompt:
-        messages.append({"role": "user", "content": user_prompt})
         # Save to session history
-        session['messages'].append({"role": "user", "content": user_prompt})
-        # Force session to persist changes
-        session.modified = True
+        user_message = {"role": "user", "content": user_prompt}
+        history_store.append(session_id, user_message)
+        history.append(user_message)
+    
+    cache_key, cached_message = lookup_completion(messages)
     
     try:
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model=CONFIG["openai_model"],
-            messages=messages,
-            temperature=CONFIG["temperature"],
-            top_p=CONFIG["top_p"],
-            max_tokens=CONFIG["max_tokens"]
-        )
-        
-        # Extract agent response
-        agent_message = response.choices[0].message.content
+        started = time.perf_counter()
+        if cached_message is not None:
+            agent_message = cached_message
+        else:
+            # Call OpenAI API
+            response = get_client().chat.completions.create(
+                model=CONFIG["openai_model"],
+                messages=messages,
+                temperature=CONFIG["temperature"],
+                top_p=CONFIG["top_p"],
+                max_tokens=CONFIG["max_tokens"]
+            )
+            
+            record_openai_call("chat", time.perf_counter() - started, response.usage)
+            
+            # Extract agent response
+            agent_message = response.choices[0].message.content
+            store_completion(cache_key, agent_message)
+        latency_ms = (time.perf_counter() - started) * 1000
         
         # Save agent response to session history
-        session['messages'].append({"role": "agent", "content": agent_message})
-        session.modified = True
+        agent_entry = {"role": "agent", "content": agent_message}
+        history_store.append(session_id, agent_entry)
+        history.append(agent_entry)
         
         return jsonify({
             "response": agent_message,
-            "messages": session['messages']
+            "messages": history,
+            "metadata": {
+                "latency_ms": round(latency_ms, 1),
+                "cache": cache_metadata(cache_key, cached_message is not None),
+                "prompt": prompt_info
+            }
         })
     except Exception as e:
-        print(f"Error calling OpenAI API: {str(e)}")
+        openai_errors.inc(endpoint="chat")
+        logger.error("Error calling OpenAI API: %s", e)
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/clear-history', methods=['POST'])
+@bp.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    data = request.json
+    system_prompt = data.get('system_prompt', '')
+    user_prompt = data.get('user_prompt', '')
+    
+    session_id = get_session_id()
+    history = history_store.get(session_id)
+    messages, prompt_info = fit_prompt(build_chat_messages(system_prompt, history, user_prompt))
+    
+    if user_prompt:
+        user_message = {"role": "user", "content": user_prompt}
+        history_store.append(session_id, user_message)
+        history.append(user_message)
+    
+    cache_key, cached_message = lookup_completion(messages)
+    
+    def generate():
+        started = time.perf_counter()
+        ttft_ms = None
+        usage = None
+        parts = []
+        
+        try:
+            if cached_message is not None:
+                # Cached replies go out as a single delta
+                ttft_ms = (time.perf_counter() - started) * 1000
+                parts.append(cached_message)
+                yield format_sse('delta', {"content": cached_message})
+            else:
+                stream = get_client().chat.completions.create(
+                    model=CONFIG["openai_model"],
+                    messages=messages,
+                    temperature=CONFIG["temperature"],
+                    top_p=CONFIG["top_p"],
+                    max_tokens=CONFIG["max_tokens"],
+                    stream=True,
+                    **stream_options()
+                )
+                for chunk in stream:
+                    # With include_usage the last chunk has usage and no choices
+                    usage = getattr(chunk, 'usage', None) or usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if ttft_ms is None:
+                            ttft_ms = (time.perf_counter() - started) * 1000
+                        parts.append(delta)
+                        yield format_sse('delta', {"content": delta})
+        except Exception as e:
+            openai_errors.inc(endpoint="stream")
+            logger.error("Error calling OpenAI API: %s", e)
+            yield format_sse('error', {"error": str(e)})
+            return
+        
+        agent_message = ''.join(parts)
+        latency_ms = (time.perf_counter() - started) * 1000
+        if cached_message is None:
+            record_openai_call("stream", latency_ms / 1000, usage,
+                               ttft_ms / 1000 if ttft_ms is not None else None)
+            store_completion(cache_key, agent_message)
+        
+        # Store the assembled reply once the stream has ended
+        agent_entry = {"role": "agent", "content": agent_message}
+        history_store.append(session_id, agent_entry)
+        history.append(agent_entry)
+        yield format_sse('done', {
+            "response": agent_message,
+            "messages": history,
+            "metadata": {
+                "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+                "latency_ms": round(latency_ms, 1),
+                "cache": cache_metadata(cache_key, cached_message is not None),
+                "prompt": prompt_info
+            }
+        })
+    
+    return Response(stream_with_context(generate()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/api/clear-history', methods=['POST'])
 def clear_history():
-    session['messages'] = []
-    session.modified = True
+    history_store.clear(get_session_id())
     return jsonify({"status": "success", "messages": []})
 
-@app.route('/api/save-history', methods=['POST'])
+@bp.route('/api/save-history', methods=['POST'])
 def save_history():
-    if 'messages' not in session or not session['messages']:
+    messages = history_store.get(get_session_id())
+    if not messages:
         return jsonify({"status": "error", "message": "No dialogue history to save"}), 400
     
     selected_id = request.json.get('dialogue_id')
     if not selected_id:
         return jsonify({"status": "error", "message": "No dialogue ID provided"}), 400
     
-    def try_save_to_file(file_path, dialogue_id):
-        """Try to save dialogue history to the specified file path"""
-        try:
-            if not file_path.exists():
-                print(f"Data file not found: {file_path}")
-                return None, f"Data file not found: {file_path}"
-            
-            # Load the current data
-            with open(file_path, 'r', encoding='utf-8-sig') as f:
-                data = json.load(f)
-            
-            # Debug: Print the available dialogue IDs
-            print(f"File: {file_path}")
-            print(f"Available dialogue IDs in file: {list(data.keys())[:5]} (showing first 5)")
-            print(f"Looking for dialogue ID: {dialogue_id}")
-            
-            # Ensure dialogue ID has .json extension for lookup
-            dialogue_id_with_json = dialogue_id if dialogue_id.endswith('.json') else dialogue_id + '.json'
-            
-            # Check if the dialogue ID exists (try both with and without .json)
-            if dialogue_id_with_json in data:
-                # Add the dialogue history to the dialogue data
-                data[dialogue_id_with_json]["dialogue_history"] = session['messages']
-                print(f"Saved history to {dialogue_id_with_json}")
-                
-                # Save the updated data back to the file
-                with open(file_path, 'w', encoding='utf-8-sig') as f:
-                    json.dump(data, f, indent=2, ensure_ascii=False)
-                
-                return True, None
-            elif dialogue_id in data:
-                # If the ID without .json exists
-                data[dialogue_id]["dialogue_history"] = session['messages']
-                print(f"Saved history to {dialogue_id}")
-                
-                # Save the updated data back to the file
-                with open(file_path, 'w', encoding='utf-8-sig') as f:
-                    json.dump(data, f, indent=2, ensure_ascii=False)
-                
-                return True, None
-            else:
-                # Try approximate matching
-                possible_matches = [k for k in data.keys() if dialogue_id.replace('.json', '') in k or k.replace('.json', '') in dialogue_id]
-                if possible_matches:
-                    print(f"Possible matches found: {possible_matches}")
-                    # Use the first match
-                    match_id = possible_matches[0]
-                    data[match_id]["dialogue_history"] = session['messages']
-                    print(f"Saved history to closest match: {match_id}")
-                    
-                    # Save the updated data back to the file
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        json.dump(data, f, indent=2, ensure_ascii=False)
-                    
-                    return True, match_id
-            
-            return False, f"Dialogue ID {dialogue_id} not found in {file_path.name}"
-        except Exception as e:
-            print(f"Error processing file {file_path}: {str(e)}")
-            return None, str(e)
-    
-    # First try the main data file
-    main_file_path = Path(os.path.join(CONFIG["data_dir"], CONFIG["main_data_file"]))
-    result, message = try_save_to_file(main_file_path, selected_id)
-    
-    # If successful, return success
-    if result == True:
-        success_message = "Dialogue history saved successfully"
-        if message:  # If we found an approximate match
-            success_message = f"Dialogue history saved to closest match: {message}"
-        return jsonify({"status": "success", "message": success_message})
-    
-    # If main file doesn't exist or doesn't contain the ID, try alternative files
-    for alt_file in CONFIG["alternative_data_files"]:
-        alt_file_path = Path(os.path.join(CONFIG["data_dir"], alt_file))
-        print(f"Trying alternative file: {alt_file_path}")
-        result, message = try_save_to_file(alt_file_path, selected_id)
-        
-        # If successful, return success
-        if result == True:
-            success_message = f"Dialogue history saved to {alt_file}"
-            if message:  # If we found an approximate match
-                success_message = f"Dialogue history saved to closest match: {message} in {alt_file}"
-            return jsonify({"status": "success", "message": success_message})
+    dataset = request.json.get('dataset')
+    if dataset and not requested_dataset(dataset):
+        return jsonify({"status": "error", "message": f"Unknown dataset {dataset}"}), 404
     
-    # If we get here, no file contained the dialogue ID
-    return jsonify({"status": "error", "message": f"Dialogue ID {selected_id} not found in any data file"}), 404
+    # The dataset index says which guide file holds the dialogue (or its closest match)
+    try:
+        entry = dataset_registry.locate(selected_id, dataset)
+    except KeyError:
+        entry = None
+    if entry is None:
+        return jsonify({"status": "error", "message": f"Dialogue ID {selected_id} not found in any data file"}), 404
+    
+    file_path = Path(entry['file_path'])
+    target_id = entry['id']
+    try:
+        # The update is durable once journaled; the guide file is rewritten later by compaction
+        append_update(file_path, target_id, messages)
+    except Exception as e:
+        logger.error("Error saving history to %s: %s", file_path, e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+    
+    if journal_writer is not None:
+        journal_writer.schedule(file_path)
+    expire_corpus_file(file_path)
+    logger.info("Saved history to %s in %s", target_id, file_path)
+    
+    success_message = f"Dialogue history saved to {file_path.name}"
+    if target_id != selected_id and target_id != selected_id + '.json':
+        # We found an approximate match
+        success_message = f"Dialogue history saved to closest match: {target_id} in {file_path.name}"
+    return jsonify({"status": "success", "message": success_message})
+
+@bp.route('/api/datasets')
+def list_datasets():
+    """Datasets with their guide files; dialogues is null until a dataset has been indexed."""
+    return jsonify({"default": dataset_registry.default, "datasets": dataset_registry.status()})
+
+@bp.route('/api/stats')
+def stats():
+    """Turn, intent, utterance length, split and saved history statistics of each dataset (or ?dataset=)."""
+    if not corpus_stats.available():
+        return jsonify({"error": "Corpus statistics need numpy (pip install numpy)"}), 501
+    dataset = request.args.get('dataset')
+    if dataset and not requested_dataset(dataset):
+        return jsonify({"error": f"Unknown dataset {dataset}"}), 404
+    
+    names = [dataset] if dataset else dataset_registry.names()
+    return jsonify({"datasets": {name: get_corpus_stats(name) for name in names}})
+
+# Refresh cache counters kept by the caches themselves before each scrape;
+# completion cache lookups are counted in lookup_completion()
+def collect_cache_metrics():
+    for name, cache in {"summary": summary_cache, "turns": turn_cache, "stats": stats_cache}.items():
+        cache_requests.set_total(cache.hits, cache=name, result="hit")
+        cache_requests.set_total(cache.misses, cache=name, result="miss")
+
+metrics_registry.add_collector(collect_cache_metrics)
+
+def collect_journal_metrics():
+    if journal_writer is not None:
+        journal_compactions.set_total(journal_writer.compactions)
+        journal_updates_merged.set_total(journal_writer.updates_merged)
+
+metrics_registry.add_collector(collect_journal_metrics)
+
+@bp.route('/metrics')
+def metrics():
+    return Response(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+# Build every dataset's index, search index and ID resolver now, then move all objects
+# allocated so far into the permanent GC generation. Collections in forked workers
+# then never write to those objects' headers, so their pages stay shared.
+def preload_corpus():
+    started = time.perf_counter()
+    get_sample_index()
+    for name in dataset_registry.names():
+        get_dialogue_search(name)
+        dataset_registry.resolver(name)
+    gc.collect()
+    gc.freeze()
+    logger.info("Preloaded %d dataset(s) in %.1f ms; %d objects frozen",
+                len(dataset_registry.names()), (time.perf_counter() - started) * 1000, gc.get_freeze_count())
+
+# Index the datasets in a background thread once the app is served rather than at import,
+# so importing app loads no guide file. python app.py, gunicorn.conf.py (as each worker
+# starts) and asgi.py (on lifespan startup) call this before the first request comes in.
+@bp.before_app_request
+def start_background_index():
+    if CONFIG["background_index"] and not CONFIG["preload_corpus"]:
+        dataset_registry.start()
+
+def create_app():
+    flask_app = Flask(__name__)
+    flask_app.secret_key = os.getenv("SECRET_KEY", "default-secret-key")
+    flask_app.register_blueprint(bp)
+    
+    if CONFIG["preload_corpus"]:
+        preload_corpus()
+    return flask_app
+
+app = create_app()
 
 if __name__ == '__main__':
     debug_mode = os.getenv("FLASK_DEBUG", "True").lower() in ["true", "1", "yes"]
+    # Under the reloader only the child process serves; the parent just watches files
+    if not debug_mode or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_index()
     app.run(
         host=os.getenv("FLASK_HOST", "0.0.0.0"),
         port=int(os.getenv("FLASK_PORT", "5000")),
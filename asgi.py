@@ -0,0 +1,384 @@
+"""ASGI entry point.
+
+/api/chat and /api/chat/stream are served natively with AsyncOpenAI on a shared
+keep-alive connection pool, so one worker can hold many completions in flight.
+Every other route is handed to the Flask app, one thread pool worker per request.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import json
+import logging
+import sys
+import time
+from tempfile import SpooledTemporaryFile
+
+from asgiref.sync import async_to_sync, sync_to_async
+from itsdangerous import BadSignature
+from werkzeug.http import dump_cookie, parse_cookie
+
+from app import (CONFIG, api_key, app as flask_app, build_chat_messages, cache_metadata,
+                 fit_prompt, format_sse, get_session_id, history_store, lookup_completion,
+                 openai_errors, record_openai_call, request_latency, start_background_index,
+                 store_completion, stream_options)
+
+CHAT_PATHS = {'/api/chat': False, '/api/chat/stream': True}
+
+logger = logging.getLogger("asgi")
+
+
+class ThreadedWsgiToAsgi:
+    """Serves a WSGI app under ASGI, each request on the event loop's thread pool.
+
+    asgiref's WsgiToAsgi runs every WSGI request on one shared thread and,
+    under concurrent requests, can refuse them ("Single thread executor
+    already being used"). This adapter only uses asgiref's public
+    sync_to_async and async_to_sync; benchmarks/load_test.py checks it under
+    concurrent requests.
+    """
+
+    def __init__(self, wsgi_application):
+        self.wsgi_application = wsgi_application
+
+    async def __call__(self, scope, receive, send):
+        with SpooledTemporaryFile(max_size=65536) as body:
+            while True:
+                message = await receive()
+                if message['type'] != 'http.request':
+                    # The client went away before sending the whole body
+                    return
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+            await sync_to_async(self.run, thread_sensitive=False)(wsgi_environ(scope, body), async_to_sync(send))
+
+    def run(self, environ, send):
+        """Run the WSGI app in a worker thread, sending its response through send."""
+        response_start = None
+        started = False
+
+        def start_response(status, headers, exc_info=None):
+            nonlocal response_start
+            if exc_info is not None and started:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response_start = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+            }
+            return write
+
+        def write(data):
+            nonlocal started
+            # Headers go out with the first chunk, once start_response has been called
+            if not started:
+                started = True
+                send(response_start)
+            if data:
+                send({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+        output = self.wsgi_application(environ, start_response)
+        try:
+            for chunk in output:
+                write(chunk)
+        finally:
+            if hasattr(output, 'close'):
+                output.close()
+        write(b'')
+        send({'type': 'http.response.body'})
+
+
+def wsgi_environ(scope, body):
+    """PEP 3333 environ for an ASGI HTTP scope and its request body."""
+    script_name = scope.get('root_path', '').encode('utf-8').decode('latin-1')
+    path_info = scope['path'].encode('utf-8').decode('latin-1')
+    if path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope['headers']:
+        name = name.decode('latin-1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin-1')
+        # Repeated headers are joined, as a WSGI server would
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+class ChatApplication:
+    def __init__(self, wsgi_app):
+        self.wsgi = ThreadedWsgiToAsgi(wsgi_app)
+        self.clients = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif (scope['type'] == 'http' and scope['method'] == 'POST'
+                and scope['path'] in CHAT_PATHS):
+            await self.chat(scope, receive, timed_send(send, scope['path'], scope['method']),
+                            stream=CHAT_PATHS[scope['path']])
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                start_background_index()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.clients is not None:
+                    await self.clients.close()
+                    self.clients = None
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # The pooled clients are bound to the serving event loop, so build them on first use
+    def get_client(self):
+        if self.clients is None:
+            from llm_client import AsyncOpenAIPool
+            self.clients = AsyncOpenAIPool(CONFIG, api_key)
+        return self.clients.get()
+
+    async def chat(self, scope, receive, send, stream):
+        try:
+            data = json.loads(await read_body(receive) or b'{}')
+        except ValueError:
+            await send_json(send, 400, {"error": "Invalid JSON body"})
+            return
+
+        system_prompt = data.get('system_prompt', '')
+        user_prompt = data.get('user_prompt', '')
+
+        session_data = load_session(scope)
+        original_session = dict(session_data)
+        session_id = get_session_id(session_data)
+        # Only send a cookie when the session ID was created or migrated
+        cookie = session_cookie_header(session_data) if session_data != original_session else None
+
+        # History and completion cache calls go to SQLite, so keep them off the event loop
+        history = await asyncio.to_thread(history_store.get, session_id)
+        messages = build_chat_messages(system_prompt, history, user_prompt)
+        if CONFIG["history_summary"]:
+            # Summaries may call the model synchronously, so keep them off the event loop
+            messages, prompt_info = await asyncio.to_thread(fit_prompt, messages)
+        else:
+            messages, prompt_info = fit_prompt(messages)
+
+        if user_prompt:
+            user_message = {"role": "user", "content": user_prompt}
+            await asyncio.to_thread(history_store.append, session_id, user_message)
+            history.append(user_message)
+
+        cache_key, cached_message = await asyncio.to_thread(lookup_completion, messages)
+
+        if stream:
+            await self.chat_stream(send, session_id, history, messages, cookie,
+                                   cache_key, cached_message, prompt_info)
+            return
+
+        started = time.perf_counter()
+        if cached_message is not None:
+            agent_message = cached_message
+        else:
+            try:
+                response = await self.get_client().chat.completions.create(
+                    model=CONFIG["openai_model"],
+                    messages=messages,
+                    temperature=CONFIG["temperature"],
+                    top_p=CONFIG["top_p"],
+                    max_tokens=CONFIG["max_tokens"]
+                )
+            except Exception as e:
+                openai_errors.inc(endpoint="chat")
+                logger.error("Error calling OpenAI API: %s", e)
+                await send_json(send, 500, {"error": str(e)})
+                return
+            record_openai_call("chat", time.perf_counter() - started, response.usage)
+            agent_message = response.choices[0].message.content
+            await asyncio.to_thread(store_completion, cache_key, agent_message)
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        agent_entry = {"role": "agent", "content": agent_message}
+        await asyncio.to_thread(history_store.append, session_id, agent_entry)
+        history.append(agent_entry)
+
+        await send_json(send, 200, {
+            "response": agent_message,
+            "messages": history,
+            "metadata": {
+                "latency_ms": round(latency_ms, 1),
+                "cache": cache_metadata(cache_key, cached_message is not None),
+                "prompt": prompt_info
+            }
+        }, cookie)
+
+    async def chat_stream(self, send, session_id, history, messages, cookie,
+                          cache_key, cached_message, prompt_info):
+        headers = [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no')
+        ]
+        if cookie is not None:
+            headers.append(cookie)
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+
+        async def send_event(event, payload, more_body=True):
+            await send({
+                'type': 'http.response.body',
+                'body': format_sse(event, payload).encode('utf-8'),
+                'more_body': more_body
+            })
+
+        started = time.perf_counter()
+        ttft_ms = None
+        usage = None
+        parts = []
+        try:
+            if cached_message is not None:
+                # Cached replies go out as a single delta
+                ttft_ms = (time.perf_counter() - started) * 1000
+                parts.append(cached_message)
+                await send_event('delta', {"content": cached_message})
+            else:
+                response = await self.get_client().chat.completions.create(
+                    model=CONFIG["openai_model"],
+                    messages=messages,
+                    temperature=CONFIG["temperature"],
+                    top_p=CONFIG["top_p"],
+                    max_tokens=CONFIG["max_tokens"],
+                    stream=True,
+                    **stream_options()
+                )
+                async for chunk in response:
+                    usage = getattr(chunk, 'usage', None) or usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if ttft_ms is None:
+                            ttft_ms = (time.perf_counter() - started) * 1000
+                        parts.append(delta)
+                        await send_event('delta', {"content": delta})
+        except Exception as e:
+            openai_errors.inc(endpoint="stream")
+            logger.error("Error calling OpenAI API: %s", e)
+            await send_event('error', {"error": str(e)}, more_body=False)
+            return
+
+        agent_message = ''.join(parts)
+        latency_ms = (time.perf_counter() - started) * 1000
+        if cached_message is None:
+            record_openai_call("stream", latency_ms / 1000, usage,
+                               ttft_ms / 1000 if ttft_ms is not None else None)
+            await asyncio.to_thread(store_completion, cache_key, agent_message)
+
+        # Store the assembled reply once the stream has ended
+        agent_entry = {"role": "agent", "content": agent_message}
+        await asyncio.to_thread(history_store.append, session_id, agent_entry)
+        history.append(agent_entry)
+        await send_event('done', {
+            "response": agent_message,
+            "messages": history,
+            "metadata": {
+                "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+                "latency_ms": round(latency_ms, 1),
+                "cache": cache_metadata(cache_key, cached_message is not None),
+                "prompt": prompt_info
+            }
+        }, more_body=False)
+
+
+# Observe request latency at the response headers, as the Flask after_request hook does
+def timed_send(send, route, method):
+    started = time.perf_counter()
+
+    async def wrapped(message):
+        if message['type'] == 'http.response.start':
+            request_latency.observe(time.perf_counter() - started,
+                                    route=route, method=method, status=message['status'])
+        await send(message)
+    return wrapped
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def send_json(send, status, payload, cookie=None):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode('ascii'))
+    ]
+    if cookie is not None:
+        headers.append(cookie)
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+# Read and write Flask's signed session cookie so both serving paths share sessions
+def load_session(scope):
+    cookie_header = b''
+    for name, value in scope['headers']:
+        if name == b'cookie':
+            cookie_header = value
+            break
+
+    value = parse_cookie(cookie_header.decode('latin-1')).get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not value:
+        return {}
+
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+        return dict(serializer.loads(value, max_age=max_age))
+    except BadSignature:
+        return {}
+
+
+def session_cookie_header(session_data):
+    interface = flask_app.session_interface
+    serializer = interface.get_signing_serializer(flask_app)
+    cookie = dump_cookie(
+        flask_app.config['SESSION_COOKIE_NAME'],
+        serializer.dumps(session_data),
+        domain=interface.get_cookie_domain(flask_app),
+        path=interface.get_cookie_path(flask_app),
+        secure=interface.get_cookie_secure(flask_app),
+        httponly=interface.get_cookie_httponly(flask_app),
+        samesite=interface.get_cookie_samesite(flask_app)
+    )
+    return (b'set-cookie', cookie.encode('latin-1'))
+
+
+application = ChatApplication(flask_app)
@@ -0,0 +1,246 @@
+"""Run every dialogue of the guide files through the model and write the replies to JSONL.
+
+Prompts are built from each dialogue's guideline and sample turns, the same
+data the web UI shows. Requests run concurrently (--concurrency), back off and
+retry on 429/5xx responses, and every result is appended to the output file as
+soon as it arrives, so an interrupted run picks up where it stopped when
+started again with the same --output.
+
+    python batch_replay.py TACT_interraction_datas/multiwoz/TACT_MultiWOZ_mskim_guide.json \\
+        --output replies.jsonl --concurrency 16
+
+Point OPENAI_BASE_URL at benchmarks/stub_openai_server.py to run it offline.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import openai
+
+from app import CONFIG, api_key, dataset_registry, extract_sample_dialogs, get_dialogue_data, load_corpus_file
+from llm_client import AsyncOpenAIPool
+
+DEFAULT_USER_PROMPT = "Start the conversation as the user described in the guideline would."
+
+
+def build_replay_messages(dialogue_data, user_prompt):
+    system_prompt = dialogue_data.get("guideline", "")
+    sample_dialogs = extract_sample_dialogs(dialogue_data.get("generated_data", ""))
+    if sample_dialogs:
+        examples = "\n".join(f"USER: {turn['user']}\nASSISTANT: {turn['agent']}" for turn in sample_dialogs)
+        system_prompt += f"\n\nExample dialog:\n{examples}"
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def load_completed(output_path):
+    """Return the (file, dialogue_id) pairs already answered in output_path.
+
+    A last line cut short by a crash is truncated away so new results start on
+    a fresh line; failed dialogues are not counted and get retried.
+    """
+    completed = set()
+    if not output_path.exists():
+        return completed
+
+    with open(output_path, 'rb+') as f:
+        content = f.read()
+        end = content.rfind(b'\n') + 1
+        if end < len(content):
+            f.truncate(end)
+
+    for line in content[:end].splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if record.get("status") == "ok":
+            completed.add((record["file"], record["dialogue_id"]))
+    return completed
+
+
+def collect_jobs(guide_files, user_prompt, completed):
+    jobs = []
+    for guide_file in guide_files:
+        data = load_corpus_file(guide_file)
+        if not data:
+            print(f"Skipping {guide_file}: no dialogues found", file=sys.stderr)
+            continue
+        for dialogue_id in data:
+            if (guide_file, dialogue_id) in completed:
+                continue
+            dialogue_data, success = get_dialogue_data(dialogue_id, guide_file)
+            if success:
+                jobs.append((guide_file, dialogue_id, build_replay_messages(dialogue_data, user_prompt)))
+    return jobs
+
+
+def is_retryable(error):
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+def retry_after(error):
+    """Seconds requested by a Retry-After header, if the server sent one."""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitGate:
+    """Shared pause: after a 429 every worker waits until the server's Retry-After has passed."""
+
+    def __init__(self):
+        self.until = 0.0
+
+    def block(self, seconds):
+        self.until = max(self.until, time.monotonic() + seconds)
+
+    async def wait(self):
+        while (delay := self.until - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+
+class BatchReplay:
+    def __init__(self, pool, output_file, concurrency, max_retries, base_delay, max_delay):
+        self.pool = pool
+        self.output_file = output_file
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.gate = RateLimitGate()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {"ok": 0, "failed": 0, "retries": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self.latencies = []
+
+    async def complete(self, messages):
+        """Call the model, retrying with capped exponential backoff and full jitter."""
+        attempt = 0
+        while True:
+            await self.gate.wait()
+            try:
+                # Retries are handled here, not by the client, so they respect the shared gate
+                client = self.pool.get().with_options(max_retries=0)
+                response = await client.chat.completions.create(
+                    model=CONFIG["openai_model"],
+                    messages=messages,
+                    temperature=CONFIG["temperature"],
+                    top_p=CONFIG["top_p"],
+                    max_tokens=CONFIG["max_tokens"]
+                )
+                return response, attempt + 1
+            except openai.APIError as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                delay = retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                if isinstance(e, openai.RateLimitError):
+                    self.gate.block(delay)
+                self.stats["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def run_job(self, guide_file, dialogue_id, messages):
+        async with self.semaphore:
+            record = {"file": guide_file, "dialogue_id": dialogue_id}
+            started = time.perf_counter()
+            try:
+                response, attempts = await self.complete(messages)
+                latency = time.perf_counter() - started
+                usage = response.usage
+                record.update(
+                    status="ok",
+                    response=response.choices[0].message.content,
+                    model=response.model,
+                    usage=usage.model_dump() if usage else None,
+                    attempts=attempts,
+                    latency_ms=round(latency * 1000, 1)
+                )
+                self.stats["ok"] += 1
+                self.latencies.append(latency)
+                if usage:
+                    self.stats["prompt_tokens"] += usage.prompt_tokens
+                    self.stats["completion_tokens"] += usage.completion_tokens
+            except Exception as e:
+                record.update(status="error", error=f"{type(e).__name__}: {e}")
+                self.stats["failed"] += 1
+
+            self.output_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.output_file.flush()
+
+    async def run(self, jobs):
+        await asyncio.gather(*(self.run_job(*job) for job in jobs))
+
+
+def throughput_report(replay, elapsed, skipped):
+    stats = replay.stats
+    latencies = sorted(replay.latencies)
+    report = dict(stats, skipped=skipped, elapsed_s=round(elapsed, 2))
+    report["dialogues_per_s"] = round(stats["ok"] / elapsed, 2) if elapsed else 0.0
+    report["completion_tokens_per_s"] = round(stats["completion_tokens"] / elapsed, 1) if elapsed else 0.0
+    report["total_tokens_per_s"] = round(
+        (stats["prompt_tokens"] + stats["completion_tokens"]) / elapsed, 1) if elapsed else 0.0
+    if latencies:
+        report["latency_ms"] = {
+            "p50": round(statistics.median(latencies) * 1000, 1),
+            "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1),
+            "max": round(latencies[-1] * 1000, 1)
+        }
+    return report
+
+
+async def replay_files(args):
+    output_path = Path(args.output)
+    completed = load_completed(output_path)
+    jobs = collect_jobs(args.guide_files, args.user_prompt, completed)
+    if args.limit:
+        jobs = jobs[:args.limit]
+    print(f"{len(jobs)} dialogue(s) to run, {len(completed)} already done", file=sys.stderr)
+
+    pool = AsyncOpenAIPool(CONFIG, api_key)
+    try:
+        with open(output_path, 'a', encoding='utf-8') as output_file:
+            replay = BatchReplay(pool, output_file, args.concurrency, args.max_retries,
+                                 args.base_delay, args.max_delay)
+            started = time.perf_counter()
+            await replay.run(jobs)
+            elapsed = time.perf_counter() - started
+    finally:
+        await pool.close()
+    return throughput_report(replay, elapsed, len(completed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("guide_files", nargs="*",
+                        help="guide JSON files (default: those of the default dataset)")
+    parser.add_argument("--output", default="batch_replies.jsonl", help="JSONL results file, appended to and resumed from")
+    parser.add_argument("--user-prompt", default=DEFAULT_USER_PROMPT, help="user message sent after the guideline")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight at once")
+    parser.add_argument("--max-retries", type=int, default=5, help="retries per dialogue on 429/5xx and connection errors")
+    parser.add_argument("--base-delay", type=float, default=1.0, help="initial backoff in seconds")
+    parser.add_argument("--max-delay", type=float, default=60.0, help="backoff cap in seconds")
+    parser.add_argument("--limit", type=int, default=0, help="run at most this many dialogues (0 = all)")
+    args = parser.parse_args()
+
+    if not args.guide_files:
+        args.guide_files = dataset_registry.get()['files'] if dataset_registry.default else []
+
+    report = asyncio.run(replay_files(args))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Time to first byte and payload size of the dialogue selector by corpus size.
+
+Serves the app over HTTP from a thread against a synthetic guide file and
+measures GET / (constant-size page, IDs loaded from /api/dialogues), a page
+and a search of /api/dialogues, and /api/dialogues/<id>. The old page, which
+rendered one <option> per dialogue, is reproduced by a benchmark-only route
+that appends the same option list to the current page.
+
+    python benchmarks/bench_dialogue_selector.py --dialogues 1000 10000 100000
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from synthetic_corpus import write_guide
+
+LEGACY_SELECTOR = """<select name="dialogue_id" class="form-select me-2" onchange="this.form.submit()">
+    {% for dialogue in dialogue_ids %}
+        <option value="{{ dialogue.id }}" {% if dialogue.id == selected_id %}selected{% endif %}>
+            {{ dialogue.id }}
+        </option>
+    {% endfor %}
+</select>"""
+
+
+def fetch(port, path, repeat):
+    """Median time to the response headers, and the body size."""
+    ttfb = []
+    size = 0
+    for _ in range(repeat):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        started = time.perf_counter()
+        conn.request("GET", path)
+        response = conn.getresponse()
+        ttfb.append(time.perf_counter() - started)
+        size = len(response.read())
+        conn.close()
+    return {"ttfb_ms": round(statistics.median(ttfb) * 1000, 2), "bytes": size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dialogues", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    # One dataset directory per corpus size
+    for count in args.dialogues:
+        (Path(tmp) / f"bench_{count}").mkdir()
+        # Short records: this measures the ID list, not record parsing
+        write_guide(Path(tmp) / f"bench_{count}" / "guide.json", count, turns=4, guideline_words=5)
+    os.environ.update(OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "sk-stub-bench"),
+                      HISTORY_DB_PATH=os.path.join(tmp, "history.sqlite3"),
+                      DATA_ROOT=tmp, BACKGROUND_INDEX="false")
+    os.chdir(ROOT)
+    import app as chat_app
+    from flask import render_template_string
+    from werkzeug.serving import make_server
+
+    @chat_app.app.route('/__bench/legacy')
+    def legacy_index():
+        page = chat_app.index()
+        dataset = chat_app.request.args.get('dataset')
+        selector = render_template_string(LEGACY_SELECTOR,
+                                          dialogue_ids=chat_app.get_corpus_index(dataset)['dialogue_ids'],
+                                          selected_id=None)
+        return page + selector
+
+    server = make_server("127.0.0.1", 0, chat_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    for count in args.dialogues:
+        dataset = f"bench_{count}"
+        started = time.perf_counter()
+        index = chat_app.get_corpus_index(dataset)
+        load_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        chat_app.get_dialogue_search(dataset)
+        search_ms = (time.perf_counter() - started) * 1000
+        keys = [dialogue['id'] for dialogue in index['dialogue_ids']]
+
+        result = {
+            "dialogues": count,
+            "corpus_load_ms": round(load_ms, 1),
+            "search_index_build_ms": round(search_ms, 1),
+            "index_page": fetch(server.port, f"/?dataset={dataset}", args.repeat),
+            "legacy_index_page": fetch(server.port, f"/__bench/legacy?dataset={dataset}", max(1, args.repeat // 4)),
+            "api_first_page": fetch(server.port, f"/api/dialogues?dataset={dataset}&limit=50", args.repeat),
+            "api_search": fetch(server.port, f"/api/dialogues?dataset={dataset}&limit=50&q=pmul0012", args.repeat),
+            "api_search_broad": fetch(server.port, f"/api/dialogues?dataset={dataset}&limit=50&q=1", args.repeat),
+            "api_detail": fetch(server.port, f"/api/dialogues/{keys[len(keys) // 2]}?dataset={dataset}", args.repeat),
+        }
+        print(json.dumps(result))
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Time and peak memory of reading a guide file: json.load vs the incremental reader.
+
+Writes a synthetic guide file shaped like the TACT exports, then measures a
+full json.load, one pass of guide_reader.iter_records(), opening an
+IndexedGuide with and without a current index sidecar, and single-dialogue
+lookups through it.
+
+    python benchmarks/bench_guide_reader.py --dialogues 10000 50000
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from guide_reader import IndexedGuide, index_path, iter_records
+
+sys.path.insert(0, str(ROOT / "benchmarks"))
+from synthetic_corpus import write_guide
+
+
+# Timed and traced in separate runs: tracemalloc slows allocation-heavy code several times over
+def measure(function):
+    started = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    result = function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, {"seconds": round(elapsed, 3), "peak_mb": round(peak / 2 ** 20, 1)}
+
+
+def json_load(path):
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        return len(json.load(f))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dialogues", type=int, nargs="+", default=[10000])
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.dialogues:
+            path = Path(tmp) / f"guide_{count}.json"
+            keys = write_guide(path, count)
+            result = {"dialogues": count, "file_mb": round(path.stat().st_size / 2 ** 20, 1)}
+
+            _, result["json_load"] = measure(lambda: json_load(path))
+            _, result["iter_records"] = measure(lambda: sum(1 for _ in iter_records(path)))
+
+            def open_cold():
+                index_path(path).unlink(missing_ok=True)
+                return IndexedGuide(path)
+
+            _, result["indexed_open_cold"] = measure(open_cold)
+            guide, result["indexed_open_warm"] = measure(lambda: IndexedGuide(path))
+
+            sample = random.Random(1).choices(keys, k=args.lookups)
+            started = time.perf_counter()
+            for key in sample:
+                guide[key]
+            result["lookup_us"] = round((time.perf_counter() - started) / len(sample) * 1e6, 1)
+            guide.close()
+
+            print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Request/response size and latency of /api/chat as a function of turn count.
+
+Compares the server-side history store (cookie carries only a session ID)
+with the old approach of keeping the whole history in Flask's signed cookie,
+which is measured by signing/verifying the same history with the app's
+session serializer. Chat calls go to the local stub server.
+
+    python benchmarks/bench_history_store.py --turns 1 10 50 100
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from stub_openai_server import start_stub_server
+
+WORDS = ("restaurant centre moderate price italian book table friday evening hotel parking wifi "
+         "taxi arrive leave station train cambridge london museum college cheap expensive north "
+         "south east west guesthouse stars reference number people nights").split()
+
+
+# Varied text so the signed cookie baseline cannot simply compress repeated turns away
+def user_turn(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(30))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[1, 5, 10, 25, 50, 100])
+    parser.add_argument("--store", default="tiered", choices=["tiered", "sqlite", "memory"])
+    args = parser.parse_args()
+
+    stub = start_stub_server()
+    tmp = tempfile.mkdtemp()
+    os.environ.update(OPENAI_API_KEY="sk-stub-bench",
+                      OPENAI_BASE_URL=f"http://127.0.0.1:{stub.port}/v1",
+                      HISTORY_STORE=args.store,
+                      HISTORY_DB_PATH=os.path.join(tmp, "history.sqlite3"))
+    os.chdir(ROOT)
+    import app as chat_app
+
+    serializer = chat_app.app.session_interface.get_signing_serializer(chat_app.app)
+    client = chat_app.app.test_client()
+    rng = random.Random(0)
+    results = []
+    turn = 0
+
+    for target in sorted(args.turns):
+        while turn < target:
+            client.post('/api/chat', json={"user_prompt": user_turn(rng)})
+            turn += 1
+
+        cookie = client.get_cookie('session')
+        request_cookie = len(cookie.value) if cookie else 0
+        started = time.perf_counter()
+        response = client.post('/api/chat', json={"user_prompt": user_turn(rng)})
+        store_latency = time.perf_counter() - started
+        turn += 1
+        history = response.json["messages"]
+
+        session_id = serializer.loads(client.get_cookie('session').value)['sid']
+        started = time.perf_counter()
+        chat_app.history_store.get(session_id)
+        store_read = time.perf_counter() - started
+
+        # What the cookie-only design would send both ways for the same history
+        started = time.perf_counter()
+        legacy_cookie = serializer.dumps({"messages": history})
+        serializer.loads(legacy_cookie)
+        legacy_overhead = time.perf_counter() - started
+
+        results.append({
+            "turns": turn,
+            "store": {
+                "request_cookie_bytes": request_cookie,
+                "response_set_cookie_bytes": len(response.headers.get("Set-Cookie", "")),
+                "latency_ms": round(store_latency * 1000, 2),
+                "history_read_ms": round(store_read * 1000, 3),
+            },
+            "cookie_session": {
+                "request_cookie_bytes": len(legacy_cookie),
+                "response_set_cookie_bytes": len(legacy_cookie),
+                "sign_verify_ms": round(legacy_overhead * 1000, 2),
+                "over_4kb_limit": len(legacy_cookie) > 4093,
+            },
+        })
+        print(json.dumps(results[-1]))
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Micro-benchmark: DialogueIdResolver.find_similar vs the original list comprehension.
+
+    python benchmarks/bench_resolver.py --size 100000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dialogue_resolver import DialogueIdResolver, linear_find_similar
+
+PREFIXES = ["PMUL", "MUL", "SNG", "SSNG", "WOZ"]
+
+
+def make_keys(size, seed):
+    rng = random.Random(seed)
+    keys = set()
+    while len(keys) < size:
+        keys.add(f"{rng.choice(PREFIXES)}{rng.randrange(10 ** 6):06d}.json")
+    keys = list(keys)
+    rng.shuffle(keys)
+    return keys
+
+
+def make_queries(keys, count, seed):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        key = rng.choice(keys)
+        kind = rng.randrange(4)
+        if kind == 0:
+            queries.append(key.replace('.json', ''))          # missing extension
+        elif kind == 1:
+            queries.append(key[1:-5])                           # truncated prefix
+        elif kind == 2:
+            queries.append(f"dialogue_{key}")                   # key embedded in a longer ID
+        else:
+            queries.append(f"XYZ{rng.randrange(10 ** 6)}")      # miss
+    return queries
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    results = [fn(q) for q in queries]
+    return results, (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=100000, help="number of dialogue IDs")
+    parser.add_argument("--queries", type=int, default=200, help="number of lookups")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    keys = make_keys(args.size, args.seed)
+    queries = make_queries(keys, args.queries, args.seed + 1)
+
+    start = time.perf_counter()
+    resolver = DialogueIdResolver(keys)
+    build_time = time.perf_counter() - start
+
+    indexed, indexed_time = timed(resolver.find_similar, queries)
+    linear, linear_time = timed(lambda q: linear_find_similar(keys, q), queries)
+
+    mismatches = sum(1 for a, b in zip(indexed, linear) if a != b)
+    print(f"dialogues:          {args.size}")
+    print(f"resolver build:     {build_time * 1000:.1f} ms")
+    print(f"resolver lookup:    {indexed_time * 1e6:.1f} us/query")
+    print(f"linear lookup:      {linear_time * 1e6:.1f} us/query")
+    print(f"speedup:            {linear_time / indexed_time:.0f}x")
+    print(f"mismatches:         {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Load time and memory of binary guide snapshots against json.load.
+
+Writes a synthetic guide file per size, then measures a full json.load,
+building the snapshot (guide_snapshot.export_snapshot), opening a current
+snapshot (mmap plus header check), one pass over all records of the
+snapshot, and random single-dialogue lookups in the json.load dict, an
+IndexedGuide and the snapshot. retained_mb is the Python heap still held by
+the loaded object; the snapshot's mapped pages are page cache shared by every
+process that maps the file, not heap.
+
+    python benchmarks/bench_snapshot.py --dialogues 10000 100000
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from guide_reader import IndexedGuide
+from guide_snapshot import export_snapshot, load_snapshot, snapshot_path
+
+sys.path.insert(0, str(ROOT / "benchmarks"))
+from bench_guide_reader import measure
+from synthetic_corpus import write_guide
+
+
+def retained(function):
+    """(result, heap MB still allocated while result is alive)."""
+    tracemalloc.start()
+    result = function()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, round(current / 2 ** 20, 1)
+
+
+def json_load(path):
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        return json.load(f)
+
+
+def lookup_us(mapping, sample):
+    started = time.perf_counter()
+    for key in sample:
+        mapping[key]
+    return round((time.perf_counter() - started) / len(sample) * 1e6, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dialogues", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.dialogues:
+            path = Path(tmp) / f"guide_{count}.json"
+            keys = write_guide(path, count)
+            result = {"dialogues": count, "file_mb": round(path.stat().st_size / 2 ** 20, 1)}
+
+            _, result["json_load"] = measure(lambda: len(json_load(path)))
+            _, result["snapshot_build"] = measure(lambda: export_snapshot(path))
+            result["snapshot_mb"] = round(snapshot_path(path).stat().st_size / 2 ** 20, 1)
+            _, result["snapshot_open"] = measure(lambda: load_snapshot(path).close())
+            # Too quick for measure()'s resolution: average of 100 opens
+            started = time.perf_counter()
+            for _ in range(100):
+                load_snapshot(path).close()
+            result["snapshot_open"]["ms"] = round((time.perf_counter() - started) * 10, 3)
+
+            data, result["json_load"]["retained_mb"] = retained(lambda: json_load(path))
+            snapshot, result["snapshot_open"]["retained_mb"] = retained(lambda: load_snapshot(path))
+            _, result["snapshot_full_pass"] = measure(lambda: sum(1 for _ in snapshot.records()))
+
+            guide = IndexedGuide(path)
+            sample = random.Random(1).choices(keys, k=args.lookups)
+            result["lookup_us"] = {
+                "dict": lookup_us(data, sample),
+                "indexed_guide": lookup_us(guide, sample),
+                "snapshot": lookup_us(snapshot, sample),
+            }
+            guide.close()
+            snapshot.close()
+            del data
+
+            print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Startup time and per-worker memory of the app under gunicorn.
+
+Writes a synthetic corpus, then for each mode starts gunicorn with --workers
+sync workers and measures:
+
+    import_s         python -c "import app" (median of --runs)
+    first_page_s     gunicorn start until the first GET / returns 200
+    warm_s           until every worker has served / for every dataset
+    workers          per-worker RSS, PSS and USS (private) memory in MB after warm-up
+
+Modes: "default" (each worker imports the app and indexes the corpus itself)
+and "preload" (gunicorn --preload with PRELOAD_CORPUS=true: the master builds
+the indexes once and workers share them copy-on-write). PSS and USS come from
+/proc/<pid>/smaps_rollup, so this runs on Linux only.
+
+    python benchmarks/bench_startup.py --workers 4 --dialogues 5000
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from load_test import free_port
+from synthetic_corpus import write_dataset
+
+MODES = {
+    "default": ([], {"PRELOAD_CORPUS": "false"}),
+    "preload": (["--preload"], {"PRELOAD_CORPUS": "true"}),
+}
+
+
+def memory(pid):
+    """RSS, PSS and USS of a process in MB."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    to_mb = lambda kb: round(kb / 1024, 1)
+    return {
+        "rss_mb": to_mb(fields.get("Rss", 0)),
+        "pss_mb": to_mb(fields.get("Pss", 0)),
+        "uss_mb": to_mb(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)),
+    }
+
+
+def worker_pids(master_pid):
+    try:
+        with open(f"/proc/{master_pid}/task/{master_pid}/children", encoding="ascii") as f:
+            return [int(pid) for pid in f.read().split()]
+    except OSError:
+        return []
+
+
+def measure_import(env, runs):
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import app"], cwd=ROOT, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - started)
+    return round(statistics.median(times), 3)
+
+
+def run_mode(mode, args, env):
+    flags, extra_env = MODES[mode]
+    port = free_port()
+    env = dict(env, **extra_env)
+    command = [shutil.which("gunicorn") or "gunicorn", "--workers", str(args.workers), "--bind", f"127.0.0.1:{port}",
+               "--log-level", "warning", *flags, "app:app"]
+    base_url = f"http://127.0.0.1:{port}"
+
+    started = time.perf_counter()
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(base_url=base_url, timeout=120) as client:
+            while True:
+                try:
+                    if client.get("/").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if server.poll() is not None:
+                    raise RuntimeError(f"gunicorn exited with {server.returncode}")
+                time.sleep(0.02)
+        first_page = time.perf_counter() - started
+
+        # Enough concurrent page loads of every dataset that each worker indexes them all
+        paths = [f"/?dataset={dataset}" for dataset in args.datasets] * (args.workers * 8)
+
+        def fetch(path):
+            with httpx.Client(base_url=base_url, timeout=300) as client:
+                client.get(path).raise_for_status()
+
+        with ThreadPoolExecutor(args.workers * 2) as executor:
+            list(executor.map(fetch, paths))
+        warm = time.perf_counter() - started
+
+        workers = [memory(pid) for pid in worker_pids(server.pid)]
+        total = lambda key: round(sum(worker[key] for worker in workers), 1)
+        return {
+            "mode": mode,
+            "first_page_s": round(first_page, 3),
+            "warm_s": round(warm, 3),
+            "master": memory(server.pid),
+            "workers": len(workers),
+            "worker_rss_mb_mean": round(total("rss_mb") / len(workers), 1),
+            "worker_pss_mb_total": total("pss_mb"),
+            "worker_uss_mb_total": total("uss_mb"),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES), default=["default", "preload"])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--datasets", nargs="+", default=["multiwoz", "slurp"])
+    parser.add_argument("--files", type=int, default=4, help="guide files per dataset")
+    parser.add_argument("--dialogues", type=int, default=5000, help="dialogues per guide file")
+    parser.add_argument("--lazy-corpus", choices=["true", "false"], default="true")
+    parser.add_argument("--runs", type=int, default=5, help="runs of the import timing")
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_startup_"))
+    for name in args.datasets:
+        write_dataset(tmp / "data", name, args.files, args.dialogues)
+    env = dict(os.environ,
+               OPENAI_API_KEY="sk-stub-bench-startup",
+               DATA_ROOT=str(tmp / "data"),
+               DEFAULT_DATASET=args.datasets[0],
+               LAZY_CORPUS=args.lazy_corpus,
+               HISTORY_DB_PATH=str(tmp / "history.sqlite3"),
+               LOG_LEVEL="WARNING")
+
+    print(json.dumps({"import_s": measure_import(env, args.runs),
+                      "dialogues": args.files * args.dialogues * len(args.datasets)}))
+    for mode in args.modes:
+        # A fresh index sidecar state for every mode
+        for sidecar in (tmp / "data").glob("*/*.idx"):
+            sidecar.unlink()
+        print(json.dumps(run_mode(mode, args, env)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""Offline benchmark suite: page loads, chat turns and saves against a stub model.
+
+Writes a synthetic corpus (benchmarks/synthetic_corpus.py), starts the stub
+OpenAI server with the given latency and token rate, and starts the app
+server (`python app.py`, or uvicorn with --server async) pointed at both
+through DATA_ROOT and OPENAI_BASE_URL. Then it runs each scenario with
+concurrent clients:
+
+    index_ready     startup until every dataset is indexed (/api/datasets)
+    page_load       GET / of random dialogues, and GET /api/dialogues pages
+    chat_h<N>       POST /api/chat from sessions that already hold N messages
+    chat_stream_h<N> the same through /api/chat/stream (p50/p99 include TTFT)
+    save            POST /api/save-history of a 10-message history to random dialogues
+
+Each scenario reports p50/p99 latency, throughput and the server's RSS
+afterwards. Results go to --output as JSON; pass an earlier result file as
+--baseline to print the change per scenario.
+
+    python benchmarks/bench_suite.py --dialogues 5000 --history 0 10 50 --output bench_results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+from flask import Flask
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from history_store import SQLiteHistoryStore
+from load_test import SERVERS, free_port, start_process, wait_for_port
+from synthetic_corpus import write_dataset
+
+SECRET_KEY = "bench-suite-secret"
+SYSTEM_PROMPT = "You are a helpful agent."
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(len(sorted_values) * fraction + 0.5) - 1))]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+
+def process_memory(pid):
+    """Current and peak RSS of a process in MB, from /proc (None elsewhere)."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return {"rss_mb": None, "peak_rss_mb": None}
+    to_mb = lambda name: round(int(fields[name].split()[0]) / 1024, 1) if name in fields else None
+    return {"rss_mb": to_mb("VmRSS"), "peak_rss_mb": to_mb("VmHWM")}
+
+
+async def run_scenario(base_url, requests, concurrency):
+    """Send requests (a list of (method, path, json, cookies)) with concurrency workers."""
+    latencies = []
+    errors = 0
+    remaining = iter(requests)
+
+    async def worker():
+        nonlocal errors
+        # One single-connection client per worker, as in load_test.py
+        async with httpx.AsyncClient(base_url=base_url, limits=httpx.Limits(max_connections=1),
+                                     timeout=120) as client:
+            for method, path, payload, cookies in remaining:
+                started = time.perf_counter()
+                try:
+                    client.cookies.clear()
+                    response = await client.request(method, path, json=payload, cookies=cookies)
+                    response.raise_for_status()
+                    await response.aread()
+                    if b"event: error" in response.content:
+                        raise RuntimeError("stream reported an error")
+                    latencies.append(time.perf_counter() - started)
+                except Exception:
+                    errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+class Sessions:
+    """Session cookies for the server, with histories written straight to its SQLite store."""
+
+    def __init__(self, db_path):
+        signer = Flask("bench_suite")
+        signer.secret_key = SECRET_KEY
+        self.serializer = signer.session_interface.get_signing_serializer(signer)
+        self.store = SQLiteHistoryStore(db_path)
+        self.count = 0
+
+    def create(self, messages, rng):
+        self.count += 1
+        session_id = f"bench-{self.count:06d}"
+        for i in range(messages):
+            role = "user" if i % 2 == 0 else "agent"
+            self.store.append(session_id, {"role": role, "content": f"Turn {i}: " + "lorem ipsum " * rng.randint(5, 40)})
+        return {"session": self.serializer.dumps({"sid": session_id})}
+
+
+def wait_until_indexed(base_url, timeout):
+    started = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    with httpx.Client(base_url=base_url, timeout=30) as client:
+        while time.monotonic() < deadline:
+            datasets = client.get("/api/datasets").json()["datasets"]
+            if all(dataset["ready"] for dataset in datasets):
+                return time.perf_counter() - started
+            time.sleep(0.05)
+    raise RuntimeError("Datasets were not indexed in time")
+
+
+def compare(results, baseline):
+    """Print p50/p99/throughput changes against an earlier result file."""
+    print(f"\nChange vs {baseline['meta'].get('timestamp')} ({baseline['meta'].get('git_commit')}):")
+    for name, result in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        changes = []
+        for key in ("p50_ms", "p99_ms", "throughput_rps", "rss_mb"):
+            if result.get(key) is not None and before.get(key):
+                changes.append(f"{key} {before[key]} -> {result[key]} ({(result[key] / before[key] - 1) * 100:+.1f}%)")
+        print(f"  {name}: " + ", ".join(changes))
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=sorted(SERVERS), default="sync")
+    parser.add_argument("--datasets", nargs="+", default=["multiwoz", "slurp"])
+    parser.add_argument("--files", type=int, default=4, help="guide files per dataset")
+    parser.add_argument("--dialogues", type=int, default=2000, help="dialogues per guide file")
+    parser.add_argument("--history", type=int, nargs="+", default=[0, 10, 50],
+                        help="messages already in the session for the chat scenarios")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="stub tokens per second (0 = instant)")
+    parser.add_argument("--scenarios", nargs="+", default=["page_load", "chat", "chat_stream", "save"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tmp = Path(tempfile.mkdtemp(prefix="bench_suite_"))
+    data_root = tmp / "data"
+    corpus = {name: write_dataset(data_root, name, args.files, args.dialogues, seed=args.seed)
+              for name in args.datasets}
+    sessions = Sessions(tmp / "history.sqlite3")
+
+    stub_port = free_port()
+    stub = start_process([sys.executable, str(ROOT / "benchmarks" / "stub_openai_server.py"),
+                          "--port", str(stub_port), "--latency", str(args.latency),
+                          "--token-rate", str(args.token_rate)])
+    port = free_port()
+    env = dict(os.environ,
+               OPENAI_API_KEY="sk-stub-bench-suite",
+               OPENAI_BASE_URL=f"http://127.0.0.1:{stub_port}/v1",
+               SECRET_KEY=SECRET_KEY,
+               DATA_ROOT=str(data_root),
+               DEFAULT_DATASET=args.datasets[0],
+               HISTORY_DB_PATH=str(tmp / "history.sqlite3"),
+               COMPLETION_CACHE="false",
+               HTTP_MAX_CONNECTIONS=str(max(args.concurrency, 10)),
+               HTTP_MAX_KEEPALIVE=str(max(args.concurrency, 10)),
+               LOG_LEVEL="WARNING",
+               FLASK_DEBUG="false",
+               FLASK_HOST="127.0.0.1",
+               FLASK_PORT=str(port))
+    command = SERVERS[args.server] + (["--port", str(port)] if args.server == "async" else [])
+
+    base_url = f"http://127.0.0.1:{port}"
+    scenarios = {}
+    started = time.perf_counter()
+    server = start_process(command, env)
+    try:
+        wait_for_port(stub_port)
+        wait_for_port(port)
+        startup_s = time.perf_counter() - started
+        scenarios["index_ready"] = {"startup_s": round(startup_s, 3),
+                                    "index_ready_s": round(startup_s + wait_until_indexed(base_url, 600), 3),
+                                    **process_memory(server.pid)}
+
+        def record(name, requests):
+            result = asyncio.run(run_scenario(base_url, requests, args.concurrency))
+            scenarios[name] = dict(result, **process_memory(server.pid))
+            print(f"{name}: {json.dumps(scenarios[name])}", flush=True)
+
+        def random_dialogue():
+            dataset = rng.choice(args.datasets)
+            return dataset, rng.choice(corpus[dataset])
+
+        if "page_load" in args.scenarios:
+            record("page_load", [
+                ("GET", "/?" + str(httpx.QueryParams(dataset=dataset, dialogue_id=dialogue_id)), None, None)
+                for dataset, dialogue_id in (random_dialogue() for _ in range(args.requests))
+            ])
+            record("dialogue_page", [
+                ("GET", "/api/dialogues?" + str(httpx.QueryParams(dataset=rng.choice(args.datasets),
+                                                                  offset=rng.randrange(args.dialogues), limit=50)),
+                 None, None)
+                for _ in range(args.requests)
+            ])
+
+        for kind, path in (("chat", "/api/chat"), ("chat_stream", "/api/chat/stream")):
+            if kind not in args.scenarios:
+                continue
+            for messages in args.history:
+                record(f"{kind}_h{messages}", [
+                    ("POST", path, {"system_prompt": SYSTEM_PROMPT, "user_prompt": f"Hello {i}"},
+                     sessions.create(messages, rng))
+                    for i in range(args.requests)
+                ])
+
+        if "save" in args.scenarios:
+            requests = []
+            for _ in range(args.requests):
+                dataset, dialogue_id = random_dialogue()
+                requests.append(("POST", "/api/save-history", {"dialogue_id": dialogue_id, "dataset": dataset},
+                                 sessions.create(10, rng)))
+            record("save", requests)
+    finally:
+        server.terminate()
+        server.wait()
+        stub.terminate()
+        stub.wait()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+            "corpus": {name: len(ids) for name, ids in corpus.items()},
+        },
+        "scenarios": scenarios,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(results, json.load(f))
+    return results
+
+
+if __name__ == "__main__":
+    main()
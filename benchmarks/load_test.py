@@ -0,0 +1,148 @@
+"""Offline load test: sync Flask server vs the ASGI entry point.
+
+Starts the stub OpenAI server, then each app server in turn pointed at it via
+OPENAI_BASE_URL, and fires concurrent POST /api/chat requests. No network
+access or API key is needed.
+
+The async run also fires concurrent GET requests at Flask routes, which
+asgi.py hands to Flask through its own WSGI adapter on top of asgiref's
+sync_to_async/async_to_sync. Any failed request there exits non-zero, so an
+asgiref upgrade that breaks the adapter fails loudly.
+
+    python benchmarks/load_test.py --requests 1000 --concurrency 200 --latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SERVERS = {
+    "sync": [sys.executable, "app.py"],
+    "async": [sys.executable, "-m", "uvicorn", "asgi:application", "--host", "127.0.0.1",
+              "--no-access-log", "--log-level", "warning"],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def start_process(command, env=None):
+    return subprocess.Popen(command, cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def run_load(url, total, concurrency, method="POST", timeout=120):
+    # One single-connection client per worker: a shared httpx pool spends
+    # O(connections x queued requests) per dispatch and would dominate the run.
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        async with httpx.AsyncClient(limits=httpx.Limits(max_connections=1), timeout=timeout) as client:
+            for i in remaining:
+                started = time.perf_counter()
+                try:
+                    if method == "GET":
+                        response = await client.get(url)
+                    else:
+                        response = await client.post(url, json={"system_prompt": "You are a helpful agent.",
+                                                                "user_prompt": f"Hello {i}"})
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - started)
+                except Exception:
+                    errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        "p99_ms": round(latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000, 1) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.5, help="stub completion latency in seconds")
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    stub = start_process([sys.executable, str(ROOT / "benchmarks" / "stub_openai_server.py"),
+                          "--port", str(stub_port), "--latency", str(args.latency)])
+    results = {}
+    try:
+        wait_for_port(stub_port)
+        modes = ["sync", "async"] if args.mode == "both" else [args.mode]
+        for mode in modes:
+            port = free_port()
+            env = dict(os.environ,
+                       OPENAI_API_KEY="sk-stub-load-test",
+                       OPENAI_BASE_URL=f"http://127.0.0.1:{stub_port}/v1",
+                       HTTP_MAX_CONNECTIONS=os.environ.get("HTTP_MAX_CONNECTIONS", str(max(args.concurrency, 10))),
+                       HTTP_MAX_KEEPALIVE=os.environ.get("HTTP_MAX_KEEPALIVE", str(max(args.concurrency, 10))),
+                       FLASK_DEBUG="false",
+                       FLASK_HOST="127.0.0.1",
+                       FLASK_PORT=str(port))
+            command = SERVERS[mode] + (["--port", str(port)] if mode == "async" else [])
+            server = start_process(command, env)
+            try:
+                wait_for_port(port)
+                results[mode] = asyncio.run(run_load(f"http://127.0.0.1:{port}/api/chat",
+                                                     args.requests, args.concurrency))
+                print(f"{mode:>5}: {json.dumps(results[mode])}")
+                if mode == "async":
+                    # A page read takes milliseconds; a stalled adapter shows up as timeouts
+                    results["async_wsgi"] = asyncio.run(run_load(f"http://127.0.0.1:{port}/api/dialogues",
+                                                                 args.requests, args.concurrency,
+                                                                 method="GET", timeout=10))
+                    print(f"async /api/dialogues: {json.dumps(results['async_wsgi'])}")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    if results.get("async_wsgi", {}).get("errors"):
+        sys.exit("Flask routes failed under concurrent requests through asgi.py's WSGI adapter "
+                 "(check the installed asgiref against requirements.txt)")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Concurrent saves into one guide file: checks that no update is lost.
+
+Starts --savers savers spread over --processes worker processes, all saving
+into the same synthetic guide file. Each saver owns its own dialogues and
+saves a numbered history --saves times. Every process runs its own
+CompactionWriter, so compactions in one process race with appends and
+compactions in the others and only the fcntl file locks keep them apart. At the end the guide
+file must hold each saver's last history for each of its dialogues, and no
+journal lines may be left over.
+
+    python benchmarks/stress_save_history.py --savers 50 --processes 5 --saves 20
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from annotation_journal import CompactionWriter, append_update, compact, read_compacting_updates, read_updates
+
+
+def write_guide(path, dialogue_ids):
+    data = {
+        dialogue_id: {"guideline": f"Guideline for {dialogue_id}.", "generated_data": "0 [USER] Hi.\n1 [SYSTEM] Hello."}
+        for dialogue_id in dialogue_ids
+    }
+    with open(path, 'w', encoding='utf-8-sig') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def history(saver, dialogue_id, sequence):
+    return [{"role": "user", "content": f"saver {saver} dialogue {dialogue_id} save {sequence}"}]
+
+
+def run_savers(guide_path, savers, saves, dialogues_per_saver, delay, seed):
+    """Run the given savers as threads of this process; returns (save latencies, compactions)."""
+    writer = CompactionWriter(delay)
+    latencies = []
+    lock = threading.Lock()
+
+    def saver_thread(saver):
+        rng = random.Random(seed * 1000 + saver)
+        owned = [f"D{saver:03d}-{i}" for i in range(dialogues_per_saver)]
+        for sequence in range(saves):
+            # Save every owned dialogue once more, in a random order
+            for dialogue_id in rng.sample(owned, len(owned)):
+                started = time.perf_counter()
+                append_update(guide_path, dialogue_id, history(saver, dialogue_id, sequence))
+                writer.schedule(guide_path)
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+            time.sleep(rng.random() * 0.01)
+
+    threads = [threading.Thread(target=saver_thread, args=(saver,)) for saver in savers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.stop()
+    return latencies, writer.compactions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--savers", type=int, default=50)
+    parser.add_argument("--processes", type=int, default=5)
+    parser.add_argument("--saves", type=int, default=20, help="saves per dialogue per saver")
+    parser.add_argument("--dialogues-per-saver", type=int, default=2)
+    parser.add_argument("--filler", type=int, default=2000, help="extra dialogues nobody saves to")
+    parser.add_argument("--delay", type=float, default=0.05, help="compaction delay in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    guide_path = os.path.join(tempfile.mkdtemp(), "stress_guide.json")
+    owned = [f"D{saver:03d}-{i}" for saver in range(args.savers) for i in range(args.dialogues_per_saver)]
+    write_guide(guide_path, owned + [f"F{i:06d}" for i in range(args.filler)])
+
+    groups = [list(range(args.savers))[p::args.processes] for p in range(args.processes)]
+    started = time.perf_counter()
+    with ProcessPoolExecutor(args.processes) as executor:
+        futures = [executor.submit(run_savers, guide_path, group, args.saves, args.dialogues_per_saver,
+                                   args.delay, args.seed) for group in groups if group]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    # Anything a process left in the journal is merged here
+    leftover = compact(guide_path)
+    with open(guide_path, 'r', encoding='utf-8-sig') as f:
+        data = json.load(f)
+
+    lost = [
+        dialogue_id for dialogue_id in owned
+        if data[dialogue_id].get("dialogue_history") != history(int(dialogue_id[1:4]), dialogue_id, args.saves - 1)
+    ]
+    latencies = sorted(latency for result in results for latency in result[0])
+    total_saves = len(owned) * args.saves
+    report = {
+        "savers": args.savers,
+        "processes": args.processes,
+        "saves": len(latencies),
+        "expected_saves": total_saves,
+        "saves_per_s": round(len(latencies) / elapsed, 1),
+        "save_p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "save_p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+        "compactions": sum(result[1] for result in results),
+        "merged_at_end": leftover,
+        "journal_lines_left": len(read_compacting_updates(guide_path)[0]) + len(read_updates(guide_path)[0]),
+        "dialogues_checked": len(owned),
+        "lost_updates": len(lost),
+    }
+    print(json.dumps(report, indent=2))
+    if lost or len(latencies) != total_saves:
+        print(f"FAILED: {len(lost)} dialogue(s) without their last update, e.g. {lost[:5]}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
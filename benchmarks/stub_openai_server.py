@@ -0,0 +1,190 @@
+"""Local OpenAI-compatible stub for offline load tests and benchmarks.
+
+Serves POST /v1/chat/completions (plain and stream=True) with a canned reply
+after a configurable delay, so the app can be pointed at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1. Built on asyncio so a single
+process can hold thousands of concurrent connections without becoming the
+bottleneck of the measurement.
+
+    python benchmarks/stub_openai_server.py --port 8001 --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+
+REPLY = ("Sure, I can help with that. Could you tell me a bit more about what "
+         "you are looking for so I can find the best option for you?")
+
+
+class StubOpenAIServer:
+    def __init__(self, latency=0.0, token_rate=0.0, error_rate=0.0):
+        self.latency = latency
+        self.token_rate = token_rate
+        # Fraction of requests answered with 429 (Retry-After: 0) or 503, for retry testing
+        self.error_rate = error_rate
+        self.requests = 0
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                body = json.loads(await reader.readexactly(length) or b"{}") if length else {}
+
+                if method != "POST" or not path.rstrip("/").endswith("/chat/completions"):
+                    await self.send_json(writer, 404, {"error": {"message": f"Unknown path {path}"}})
+                else:
+                    self.requests += 1
+                    await self.complete(writer, body)
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def complete(self, writer, body):
+        await asyncio.sleep(self.latency)
+
+        if self.error_rate and random.random() < self.error_rate:
+            if random.random() < 0.5:
+                await self.send_json(writer, 429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                     headers={"Retry-After": "0"})
+            else:
+                await self.send_json(writer, 503, {"error": {"message": "Service unavailable"}})
+            return
+
+        words = REPLY.split(" ")
+        if body.get("max_tokens"):
+            words = words[:body["max_tokens"]]
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 4 + 1 for m in body.get("messages", []))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "stub")
+
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            await self.stream(writer, completion_id, model, words,
+                              prompt_tokens if include_usage else None)
+            return
+
+        if self.token_rate:
+            await asyncio.sleep(len(words) / self.token_rate)
+        await self.send_json(writer, 200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(words)},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(words),
+                "total_tokens": prompt_tokens + len(words),
+            },
+        })
+
+    async def stream(self, writer, completion_id, model, words, prompt_tokens=None):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+
+        async def write_chunk(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            writer.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            await writer.drain()
+
+        for i, word in enumerate(words):
+            if self.token_rate and i:
+                await asyncio.sleep(1 / self.token_rate)
+            await write_chunk(json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if i == 0 else " " + word},
+                    "finish_reason": None,
+                }],
+            }))
+        if prompt_tokens is not None:
+            # stream_options.include_usage: a final chunk with usage and no choices
+            await write_chunk(json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(words),
+                    "total_tokens": prompt_tokens + len(words),
+                },
+            }))
+        await write_chunk("[DONE]")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def send_json(self, writer, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        reason = "OK" if status == 200 else "Error"
+        extra = "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n{extra}"
+                     f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data)
+        await writer.drain()
+
+    async def serve(self, host, port, started=None):
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=4096)
+        self.port = server.sockets[0].getsockname()[1]
+        if started is not None:
+            started.set()
+        async with server:
+            await server.serve_forever()
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency=0.0, token_rate=0.0, error_rate=0.0):
+    """Run the stub on its own event loop in a daemon thread; the bound port is in .port."""
+    stub = StubOpenAIServer(latency, token_rate, error_rate)
+    started = threading.Event()
+    threading.Thread(target=lambda: asyncio.run(stub.serve(host, port, started)), daemon=True).start()
+    started.wait()
+    return stub
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="tokens per second after the first (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 429/503")
+    args = parser.parse_args()
+
+    print(f"Stub OpenAI server on http://{args.host}:{args.port}/v1")
+    try:
+        asyncio.run(StubOpenAIServer(args.latency, args.token_rate, args.error_rate).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Synthetic TACT guide files for benchmarks.
+
+Records follow the schema of the exported guide files (split, guideline and
+guide_line, generated_data with one "<n> [USER] [intent] ..." or
+"<n> [SYSTEM] ..." line per turn, source_data, intent_flow,
+number_of_turns). IDs and intents look like the MultiWOZ export
+("PMUL000123.json", find_hotel) or the SLURP export ("123", add_contact).
+
+Writes a data root in the layout DATA_ROOT expects, one directory per dataset:
+
+    python benchmarks/synthetic_corpus.py /tmp/corpus --datasets multiwoz slurp --files 4 --dialogues 10000
+"""
+import argparse
+import json
+import random
+from pathlib import Path
+
+STYLES = {
+    "multiwoz": {
+        "prefixes": ["PMUL", "SNG", "MUL", "WOZ"],
+        "intents": ["find_restaurant", "book_restaurant", "find_hotel", "book_hotel", "find_train",
+                    "book_train", "find_attraction", "book_taxi", "chitchat"],
+        "words": ("restaurant centre moderate price italian book table friday evening hotel parking wifi "
+                  "taxi arrive leave station train cambridge london museum college cheap expensive").split(),
+    },
+    "slurp": {
+        "prefixes": None,
+        "intents": ["add_contact", "send_email", "check_email", "set_alarm", "play_music", "weather_query",
+                    "calendar_set", "chitchat"],
+        "words": ("email contact alarm tomorrow morning music playlist weather rain calendar meeting remind "
+                  "send read volume louder news today address phone").split(),
+    },
+}
+
+
+def synthetic_id(rng, style, ordinal):
+    prefixes = STYLES[style]["prefixes"]
+    return f"{rng.choice(prefixes)}{ordinal:06d}.json" if prefixes else str(ordinal)
+
+
+def synthetic_record(rng, style="multiwoz", turns=12, guideline_words=150):
+    words = STYLES[style]["words"]
+    intent_flow = rng.sample(STYLES[style]["intents"], 3)
+    lines = []
+    for turn in range(turns):
+        text = " ".join(rng.choice(words) for _ in range(20))
+        if turn % 2 == 0:
+            lines.append(f"{turn} [USER] [{intent_flow[turn * len(intent_flow) // turns]}] {text}")
+        else:
+            lines.append(f"{turn} [SYSTEM] {text}")
+    guideline = " ".join(rng.choice(words) for _ in range(guideline_words))
+    return {
+        "split": rng.choice(["train", "val", "test"]),
+        "generated_data": "\n".join(lines),
+        "source_data": "\n".join(line.split("] ", 1)[0] + "] " + " ".join(rng.choice(words) for _ in range(10))
+                                 for line in lines),
+        "guide_line": guideline,
+        "intent_flow": intent_flow,
+        "number_of_turns": turns,
+        "guideline": guideline
+    }
+
+
+def write_guide(path, count, seed=0, style="multiwoz", start=0, turns=12, guideline_words=150):
+    """Write a guide file of count dialogues (IDs numbered from start); returns the IDs in file order."""
+    rng = random.Random(seed)
+    data = {}
+    for ordinal in range(start, start + count):
+        data[synthetic_id(rng, style, ordinal)] = synthetic_record(rng, style, turns, guideline_words)
+    with open(path, 'w', encoding='utf-8-sig') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    return list(data)
+
+
+def write_dataset(root, name, files, dialogues, seed=0, style=None, **record_options):
+    """Write files guide files of dialogues each under root/name, with IDs unique across the dataset."""
+    dataset_dir = Path(root) / name
+    dataset_dir.mkdir(parents=True, exist_ok=True)
+    style = style or (name if name in STYLES else "multiwoz")
+    ids = []
+    for index in range(files):
+        # Alternate the .json.json naming the real exports use
+        suffix = ".json.json" if index % 2 else ".json"
+        path = dataset_dir / f"TACT_{name}_annotator{index}_guide{suffix}"
+        ids.extend(write_guide(path, dialogues, seed=seed * 1000 + index, style=style,
+                               start=index * dialogues, **record_options))
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_root", help="directory to write <dataset>/<guide files> into")
+    parser.add_argument("--datasets", nargs="+", default=["multiwoz", "slurp"])
+    parser.add_argument("--files", type=int, default=4, help="guide files per dataset")
+    parser.add_argument("--dialogues", type=int, default=1000, help="dialogues per guide file")
+    parser.add_argument("--turns", type=int, default=12, help="turns per dialogue")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for name in args.datasets:
+        ids = write_dataset(args.output_root, name, args.files, args.dialogues, seed=args.seed, turns=args.turns)
+        size = sum(path.stat().st_size for path in (Path(args.output_root) / name).iterdir())
+        print(f"{name}: {len(ids)} dialogues in {args.files} file(s), {size / 2 ** 20:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
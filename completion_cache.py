@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# Completions are only reproducible when sampling is greedy
+def is_deterministic(temperature, top_p):
+    return temperature == 0 and top_p == 0
+
+
+def completion_key(model, messages, temperature, top_p, max_tokens):
+    payload = json.dumps({
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "top_p": top_p,
+        "max_tokens": max_tokens
+    }, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CompletionCache:
+    """Completion texts keyed by completion_key(): in-memory LRU over a SQLite store.
+
+    Entries expire after ttl seconds. The on-disk store is trimmed back to
+    max_bytes by evicting the least recently used entries.
+    """
+
+    def __init__(self, path, max_entries=1024, ttl=7 * 24 * 3600, max_bytes=100 * 1024 * 1024):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS completions (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used)")
+        self._disk_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+
+    def _connect(self):
+        if self._pid != os.getpid():
+            # Never use a connection inherited from the parent process
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key, response, created_at):
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached and now - cached[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return cached[0]
+            self._memory.pop(key, None)
+
+        conn = self._connect()
+        row = conn.execute("SELECT response, created_at FROM completions WHERE key = ?", (key,)).fetchone()
+        if row and now - row[1] < self.ttl:
+            with conn:
+                conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (now, key))
+            with self._lock:
+                self._remember(key, row[0], row[1])
+                self.hits += 1
+            return row[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, response):
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self._lock:
+            self._remember(key, response, now)
+
+        conn = self._connect()
+        with conn:
+            old = conn.execute("SELECT size FROM completions WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO completions (key, response, created_at, last_used, size) VALUES (?, ?, ?, ?, ?)",
+                (key, response, now, now, size)
+            )
+        with self._lock:
+            self._disk_bytes += size - (old[0] if old else 0)
+            over_budget = self._disk_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM completions WHERE created_at < ?", (time.time() - self.ttl,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+            if total > self.max_bytes:
+                for key, size in conn.execute(
+                        "SELECT key, size FROM completions ORDER BY last_used").fetchall():
+                    conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+        with self._lock:
+            self._disk_bytes = total
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes
+            }
@@ -0,0 +1,217 @@
+"""Corpus statistics over guide files, computed on columnar NumPy arrays.
+
+extract_columns() walks every record of a dataset once, splits each
+generated_data transcript into turns with turn_parser, and packs one value
+per turn (dialogue, speaker, intent tag, words, characters) and per dialogue
+(file, split, turns, saved history length) into flat arrays. summarize()
+then computes every aggregate with vectorized NumPy operations: turn counts,
+the intent tag distribution of the [USER] [intent] markers, utterance
+lengths, split balance and how many dialogues already have a saved
+dialogue_history. StatsCache keeps the summary of each dataset until one of
+its files or journals changes.
+
+NumPy is optional: without it available() is False and /api/stats answers 501.
+"""
+import threading
+import time
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from turn_parser import parse_turn
+
+SPEAKERS = ("USER", "SYSTEM")
+SPEAKER_CODES = {speaker: code for code, speaker in enumerate(SPEAKERS)}
+OTHER_SPEAKER = len(SPEAKERS)
+PERCENTILES = (50, 90, 99)
+
+
+def available():
+    return np is not None
+
+
+class _Vocabulary:
+    """Dense integer codes for strings, in order of first appearance."""
+
+    def __init__(self):
+        self.codes = {}
+        self.names = []
+
+    def code(self, name):
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+
+class CorpusColumns:
+    """Per-turn and per-dialogue columns of a set of guide files.
+
+    Turn columns: turn_dialogue (ordinal of the dialogue), turn_speaker (index
+    into SPEAKERS, OTHER_SPEAKER for lines that are not turns), turn_tag
+    (index into tags, -1 without one), turn_words and turn_chars. Dialogue
+    columns: dialogue_file (index into files), dialogue_split (index into
+    splits), dialogue_turns and dialogue_history (saved messages, -1 when
+    nothing was saved).
+    """
+
+    def __init__(self, files, splits, tags, turn_columns, dialogue_columns):
+        self.files = files
+        self.splits = splits
+        self.tags = tags
+        self.turn_dialogue, self.turn_speaker, self.turn_tag, self.turn_words, self.turn_chars = turn_columns
+        self.dialogue_file, self.dialogue_split, self.dialogue_turns, self.dialogue_history = dialogue_columns
+
+    @property
+    def dialogues(self):
+        return len(self.dialogue_file)
+
+    @property
+    def turns(self):
+        return len(self.turn_dialogue)
+
+
+def _records(data):
+    # IndexedGuide streams its records without filling its lookup cache
+    records = getattr(data, 'records', None)
+    return records() if records is not None else data.items()
+
+
+def extract_columns(guides):
+    """CorpusColumns of guides, a list of (file name, mapping of dialogue ID to record)."""
+    splits, tags = _Vocabulary(), _Vocabulary()
+    turn_dialogue, turn_speaker, turn_tag = array('i'), array('b'), array('i')
+    turn_words, turn_chars = array('i'), array('i')
+    dialogue_file, dialogue_split = array('i'), array('i')
+    dialogue_turns, dialogue_history = array('i'), array('i')
+
+    ordinal = 0
+    for file_code, (_, data) in enumerate(guides):
+        for _, record in _records(data or {}):
+            if not isinstance(record, dict):
+                continue
+            text = (record.get("generated_data") or "").strip()
+            lines = text.split('\n') if text else []
+            for position, line in enumerate(lines):
+                turn = parse_turn(line, position)
+                turn_dialogue.append(ordinal)
+                turn_speaker.append(SPEAKER_CODES.get(turn.speaker, OTHER_SPEAKER))
+                turn_tag.append(tags.code(turn.intent) if turn.intent else -1)
+                turn_words.append(len(turn.text.split()))
+                turn_chars.append(len(turn.text))
+
+            history = record.get("dialogue_history")
+            dialogue_file.append(file_code)
+            dialogue_split.append(splits.code(str(record.get("split") or "unknown")))
+            dialogue_turns.append(len(lines))
+            dialogue_history.append(len(history) if isinstance(history, list) else -1)
+            ordinal += 1
+
+    to_numpy = lambda column: np.frombuffer(column, dtype=np.int8 if column.typecode == 'b' else np.intc)
+    return CorpusColumns(
+        [name for name, _ in guides], splits.names, tags.names,
+        [to_numpy(column) for column in (turn_dialogue, turn_speaker, turn_tag, turn_words, turn_chars)],
+        [to_numpy(column) for column in (dialogue_file, dialogue_split, dialogue_turns, dialogue_history)]
+    )
+
+
+def describe(values):
+    """Mean, percentiles and max of an integer array (None when it is empty)."""
+    if not len(values):
+        return None
+    percentiles = np.percentile(values, PERCENTILES)
+    return dict(
+        mean=round(float(values.mean()), 2),
+        **{f"p{p}": round(float(value), 2) for p, value in zip(PERCENTILES, percentiles)},
+        max=int(values.max())
+    )
+
+
+def _counts(codes, names):
+    """{name: count} of non-negative codes, most frequent first."""
+    counts = np.bincount(codes[codes >= 0], minlength=len(names))
+    order = np.argsort(-counts, kind='stable')
+    return {names[i]: int(counts[i]) for i in order if counts[i]}
+
+
+def summarize(columns):
+    """Aggregates of CorpusColumns as a JSON-ready dict."""
+    turns_per_dialogue = columns.dialogue_turns
+    saved = columns.dialogue_history >= 0
+    user = columns.turn_speaker == SPEAKER_CODES["USER"]
+    system = columns.turn_speaker == SPEAKER_CODES["SYSTEM"]
+    file_dialogues = np.bincount(columns.dialogue_file, minlength=len(columns.files))
+    file_saved = np.bincount(columns.dialogue_file[saved], minlength=len(columns.files))
+    turn_histogram = np.bincount(turns_per_dialogue) if columns.dialogues else np.zeros(0, dtype=np.intp)
+
+    return {
+        "dialogues": columns.dialogues,
+        "turns": columns.turns,
+        "files": [{"file": name, "dialogues": int(file_dialogues[i]), "saved_histories": int(file_saved[i])}
+                  for i, name in enumerate(columns.files)],
+        "turns_per_dialogue": describe(turns_per_dialogue),
+        "turns_per_dialogue_histogram": {int(count): int(dialogues)
+                                         for count, dialogues in enumerate(turn_histogram) if dialogues},
+        "speakers": {
+            "USER": int(user.sum()),
+            "SYSTEM": int(system.sum()),
+            "other": int((columns.turn_speaker == OTHER_SPEAKER).sum())
+        },
+        "user_intents": _counts(columns.turn_tag[user], columns.tags),
+        "system_tags": _counts(columns.turn_tag[system], columns.tags),
+        "utterance_words": {"USER": describe(columns.turn_words[user]),
+                            "SYSTEM": describe(columns.turn_words[system])},
+        "utterance_chars": {"USER": describe(columns.turn_chars[user]),
+                            "SYSTEM": describe(columns.turn_chars[system])},
+        "splits": _counts(columns.dialogue_split, columns.splits),
+        "saved_histories": {
+            "dialogues": int(saved.sum()),
+            "fraction": round(float(saved.mean()), 4) if columns.dialogues else 0.0,
+            "messages": describe(columns.dialogue_history[saved])
+        }
+    }
+
+
+def compute(guides):
+    """summarize(extract_columns(guides)), with how long each step took."""
+    started = time.perf_counter()
+    columns = extract_columns(guides)
+    extracted = time.perf_counter()
+    stats = summarize(columns)
+    stats["timing_ms"] = {
+        "extract": round((extracted - started) * 1000, 1),
+        "aggregate": round((time.perf_counter() - extracted) * 1000, 1)
+    }
+    return stats
+
+
+class StatsCache:
+    """Latest statistics per dataset, recomputed when the corpus version changes.
+
+    A dataset is computed by one thread at a time; requests arriving while it
+    runs wait for that result instead of starting their own.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, name, version, compute_stats):
+        with self._lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            stats = compute_stats()
+            self._entries[name] = (version, stats)
+            return stats
@@ -0,0 +1,227 @@
+"""Guide file discovery and a merged dialogue ID index per dataset.
+
+Every subdirectory of the data root is a dataset (multiwoz, slurp, ...) and
+every guide file in it is part of that dataset: *.json, which includes the
+*.json.json names, but not <guide file>.index.json offset sidecars left by
+earlier versions. Offset sidecars (.idx), snapshots (.snap), annotation
+journals (*.journal.jsonl) and compaction temp files never match.
+
+DatasetRegistry keeps one index per dataset mapping each dialogue ID to the
+file it lives in, so a lookup or a save goes straight to the right file
+instead of trying the files one after another. start() builds the indexes in
+a background thread; a request that needs a dataset before then builds (or
+waits for) just that one. A process forked while that thread runs gets fresh
+locks and finishes the indexing in a thread of its own.
+"""
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from dialogue_resolver import DialogueIdResolver
+from guide_reader import LEGACY_INDEX_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+GUIDE_GLOB = '*.json'
+
+
+def is_guide_file(path):
+    return path.is_file() and not path.name.endswith(LEGACY_INDEX_SUFFIX)
+
+
+def discover_guide_files(dataset_dir):
+    return sorted(path for path in Path(dataset_dir).glob(GUIDE_GLOB) if is_guide_file(path))
+
+
+def discover_datasets(root):
+    """{dataset name: [guide file paths]} for the subdirectories of root that hold guide files."""
+    root = Path(root)
+    if not root.is_dir():
+        return {}
+    datasets = {}
+    for dataset_dir in sorted(path for path in root.iterdir() if path.is_dir()):
+        files = discover_guide_files(dataset_dir)
+        if files:
+            datasets[dataset_dir.name] = files
+    return datasets
+
+
+class DatasetRegistry:
+    """Dialogue ID indexes of the datasets under root.
+
+    load_file(path) returns (data, version) for a guide file, data being a
+    mapping of dialogue ID to record (None when unreadable) and version a
+    number that increases whenever the data changes; an index is rebuilt
+    when any of its files' versions change or files are added or removed.
+    Files are loaded and indexes built outside the dataset's lock, so while
+    one request rebuilds an index, others keep getting the current one.
+
+    An index is a dict with the dataset name, 'dialogue_ids' (one entry per
+    distinct ID: id, file_path, file_name, dataset; files in name order, the
+    first file holding an ID wins), 'by_id', and 'search' and 'resolver'
+    slots for lazily built DialogueIdResolvers.
+    """
+
+    def __init__(self, root, load_file, default=None, check_interval=1.0):
+        self.root = Path(root)
+        self.load_file = load_file
+        self.check_interval = check_interval
+        self._files = discover_datasets(self.root)
+        self._checked_at = time.monotonic()
+        self._indexes = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._indexed = False
+        self.default = default if default in self._files else next(iter(self._files), None)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def names(self):
+        self._refresh_files()
+        return list(self._files)
+
+    def __contains__(self, name):
+        return name in self.names()
+
+    def dataset_of(self, file_path):
+        """Name of the dataset a guide file belongs to, or None."""
+        parent = Path(file_path).resolve().parent
+        for name in self.names():
+            if (self.root / name).resolve() == parent:
+                return name
+        return None
+
+    def _refresh_files(self):
+        # Pick up guide files added or removed since the last look, at most once per check interval
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        files = discover_datasets(self.root)
+        with self._lock:
+            self._files = files
+            self._checked_at = now
+            if self.default not in files:
+                self.default = next(iter(files), None)
+
+    def _dataset_lock(self, name):
+        with self._lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name=None):
+        """Index of dataset name (default: the default dataset); KeyError if there is no such dataset."""
+        self._refresh_files()
+        name = name or self.default
+        if name not in self._files:
+            raise KeyError(name)
+
+        started = time.perf_counter()
+        files = [(path, *self.load_file(path)) for path in self._files.get(name, [])]
+        signature = tuple((str(path), version) for path, _, version in files)
+        with self._dataset_lock(name):
+            index = self._indexes.get(name)
+            if index is not None and index['signature'] == signature:
+                return index
+
+        dialogue_ids = []
+        by_id = {}
+        for path, data, _ in files:
+            for dialogue_id in (data or {}).keys():
+                if dialogue_id not in by_id:
+                    by_id[dialogue_id] = {
+                        'id': dialogue_id,
+                        'file_path': str(path),
+                        'file_name': path.name,
+                        'dataset': name
+                    }
+                    dialogue_ids.append(by_id[dialogue_id])
+
+        with self._dataset_lock(name):
+            current = self._indexes.get(name)
+            if current is not None and self._is_older(signature, current['signature']):
+                # Another request swapped in an index of newer data while this one was building
+                return current
+            index = {
+                'name': name,
+                'signature': signature,
+                'files': [str(path) for path, _, _ in files],
+                'dialogue_ids': dialogue_ids,
+                'by_id': by_id,
+                'search': None,
+                'resolver': None,
+                'lock': threading.Lock()
+            }
+            self._indexes[name] = index
+        logger.info("Indexed %d dialogues of dataset %s from %d file(s) in %.1f ms",
+                    len(dialogue_ids), name, len(files), (time.perf_counter() - started) * 1000)
+        return index
+
+    @staticmethod
+    def _is_older(signature, other):
+        # True when any file has an older version in signature than in other
+        versions = dict(other)
+        return any(path in versions and version < versions[path] for path, version in signature)
+
+    def locate(self, dialogue_id, name=None):
+        """Index entry for dialogue_id in dataset name: exact, then with .json, then the closest ID."""
+        index = self.get(name)
+        by_id = index['by_id']
+        entry = by_id.get(dialogue_id)
+        if entry is None and not dialogue_id.endswith('.json'):
+            entry = by_id.get(dialogue_id + '.json')
+        if entry is None and by_id:
+            match_id = self._resolver(index).find_similar(dialogue_id)
+            entry = by_id.get(match_id) if match_id is not None else None
+        return entry
+
+    def resolver(self, name=None):
+        """DialogueIdResolver over the IDs of dataset name, built on first use."""
+        return self._resolver(self.get(name))
+
+    def _resolver(self, index):
+        with index['lock']:
+            if index['resolver'] is None:
+                index['resolver'] = DialogueIdResolver(index['by_id'])
+            return index['resolver']
+
+    def is_ready(self, name):
+        return name in self._indexes
+
+    def status(self):
+        return [{
+            'name': name,
+            'files': [path.name for path in files],
+            'ready': self.is_ready(name),
+            'dialogues': len(self._indexes[name]['dialogue_ids']) if self.is_ready(name) else None
+        } for name, files in list(self._files.items())]
+
+    def start(self):
+        """Build every dataset's index in a background thread, the default dataset first."""
+        if self._thread is not None:
+            return self._thread
+        names = sorted(self._files, key=lambda name: name != self.default)
+        self._thread = threading.Thread(target=self._build_all, args=(names,),
+                                        name="dataset-index", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def _build_all(self, names):
+        for name in names:
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error("Error indexing dataset %s: %s", name, e)
+        self._indexed = True
+
+    def _after_fork(self):
+        # Only the forking thread survives in the child, and any lock another
+        # thread held at fork time would stay held forever
+        self._lock = threading.Lock()
+        self._locks = {}
+        for index in self._indexes.values():
+            index['lock'] = threading.Lock()
+        if self._thread is not None and not self._indexed:
+            self._thread = None
+            self.start()
@@ -0,0 +1,98 @@
+from array import array
+
+NGRAM_SIZE = 3
+
+
+# Strip the .json extension the same way the original lookup code did
+def normalize_dialogue_id(dialogue_id):
+    return dialogue_id.replace('.json', '')
+
+
+class DialogueIdResolver:
+    """Fuzzy dialogue ID lookup built once per loaded corpus.
+
+    find_similar() returns the same key as the original linear scan
+
+        [k for k in keys if id.replace('.json', '') in k or k.replace('.json', '') in id][0]
+
+    but uses n-gram postings for the "query in key" side and a hash map of
+    normalized keys for the "key in query" side.
+    """
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.exact = {}
+        self.normalized = {}
+        self.postings = {}
+        self.max_normalized_len = 0
+
+        for ordinal, key in enumerate(self.keys):
+            self.exact.setdefault(key, ordinal)
+            normalized = normalize_dialogue_id(key)
+            self.normalized.setdefault(normalized, ordinal)
+            self.max_normalized_len = max(self.max_normalized_len, len(normalized))
+
+            # Postings for 1..NGRAM_SIZE grams so short queries are indexed too
+            seen = set()
+            for size in range(1, NGRAM_SIZE + 1):
+                for start in range(len(key) - size + 1):
+                    gram = key[start:start + size]
+                    if gram not in seen:
+                        seen.add(gram)
+                        self.postings.setdefault(gram, array('I')).append(ordinal)
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Ordinals of keys containing query, in corpus order
+    def _iter_containing(self, query):
+        if not query:
+            yield from range(len(self.keys))
+            return
+
+        size = min(len(query), NGRAM_SIZE)
+        shortest = None
+        for start in range(len(query) - size + 1):
+            posting = self.postings.get(query[start:start + size])
+            if posting is None:
+                return
+            if shortest is None or len(posting) < len(shortest):
+                shortest = posting
+
+        for ordinal in shortest:
+            if query in self.keys[ordinal]:
+                yield ordinal
+
+    # First key (in corpus order) whose normalized form is a substring of dialogue_id
+    def _first_contained_in(self, dialogue_id):
+        best = None
+        length = len(dialogue_id)
+        for start in range(length + 1):
+            for end in range(start, min(length, start + self.max_normalized_len) + 1):
+                ordinal = self.normalized.get(dialogue_id[start:end])
+                if ordinal is not None and (best is None or ordinal < best):
+                    best = ordinal
+        return best
+
+    def search(self, query, offset=0, limit=50):
+        """Return (match count, ordinals[offset:offset + limit]) of keys containing query, in corpus order."""
+        if not query:
+            return len(self.keys), list(range(offset, min(len(self.keys), offset + limit)))
+        ordinals = list(self._iter_containing(query))
+        return len(ordinals), ordinals[offset:offset + limit]
+
+    def find_similar(self, dialogue_id):
+        """Return the first approximately matching key, or None."""
+        containing = next(self._iter_containing(normalize_dialogue_id(dialogue_id)), None)
+        contained = self._first_contained_in(dialogue_id)
+
+        candidates = [o for o in (containing, contained) if o is not None]
+        if not candidates:
+            return None
+        return self.keys[min(candidates)]
+
+
+# Reference implementation kept for benchmarks and spot checks
+def linear_find_similar(keys, dialogue_id):
+    possible_matches = [k for k in keys if dialogue_id.replace('.json', '') in k or k.replace('.json', '') in dialogue_id]
+    return possible_matches[0] if possible_matches else None
@@ -0,0 +1,245 @@
+"""Incremental reading of guide JSON files.
+
+iter_records() yields the top-level (dialogue_id, record) pairs of a guide file
+while reading it in chunks, so memory stays around one record plus one chunk
+instead of several times the file size. load_index() keeps a sidecar
+<guide file>.idx with the byte offset and length of every record, rebuilt
+only when the guide file changes, and IndexedGuide is a Mapping over that
+index that parses a record only when it is looked up. The sidecar name does
+not end in .json, so *.json globs over guide files never pick it up.
+"""
+import codecs
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+
+from annotation_journal import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = '.idx'
+# Earlier sidecar name, removed when the index is next rebuilt
+LEGACY_INDEX_SUFFIX = '.index.json'
+INDEX_VERSION = 1
+CHUNK_SIZE = 1 << 20
+
+_WHITESPACE = re.compile(rb'[ \t\n\r]*')
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+# A whole string, a bracket, or a lone quote where a string runs past the buffer
+_TOKEN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}]|"', re.DOTALL)
+_SCALAR_END = re.compile(rb'[,}\]\s]')
+
+
+def index_path(guide_path):
+    return Path(str(guide_path) + INDEX_SUFFIX)
+
+
+def iter_members(f):
+    """Yield (key, offset, raw_value) for each member of the top-level object in binary file f.
+
+    offset is the byte position of raw_value in the file. Values are not
+    parsed, only delimited, by skipping whole strings and counting brackets.
+    """
+    buf = f.read(max(CHUNK_SIZE, len(codecs.BOM_UTF8)))
+    base = 0
+    pos = len(codecs.BOM_UTF8) if buf.startswith(codecs.BOM_UTF8) else 0
+
+    def more():
+        nonlocal buf
+        chunk = f.read(CHUNK_SIZE)
+        buf += chunk
+        return bool(chunk)
+
+    def skip_whitespace(pos):
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos < len(buf) or not more():
+                return pos
+
+    def expect(pos, char):
+        pos = skip_whitespace(pos)
+        if buf[pos:pos + 1] != char:
+            raise ValueError(f"Expected {char.decode()!r} at byte {base + pos}")
+        return pos + 1
+
+    def match_string(pos):
+        while True:
+            m = _STRING.match(buf, pos)
+            if m:
+                return m
+            if not more():
+                raise ValueError(f"Unterminated string at byte {base + pos}")
+
+    pos = expect(pos, b'{')
+    first = True
+    while True:
+        pos = skip_whitespace(pos)
+        if buf[pos:pos + 1] == b'}':
+            return
+        if not first:
+            pos = skip_whitespace(expect(pos, b','))
+        first = False
+
+        if buf[pos:pos + 1] != b'"':
+            raise ValueError(f"Expected a key at byte {base + pos}")
+        m = match_string(pos)
+        key = json.loads(m.group())
+        start = skip_whitespace(expect(m.end(), b':'))
+
+        char = buf[start:start + 1]
+        if char in (b'{', b'['):
+            depth = 0
+            scan = start
+            end = None
+            while end is None:
+                for m in _TOKEN.finditer(buf, scan):
+                    token = m.group()
+                    if token == b'"':
+                        break
+                    scan = m.end()
+                    if token in (b'{', b'['):
+                        depth += 1
+                    elif token in (b'}', b']'):
+                        depth -= 1
+                        if depth == 0:
+                            end = scan
+                            break
+                if end is None and not more():
+                    raise ValueError(f"Unterminated value for key {key!r}")
+        elif char == b'"':
+            end = match_string(start).end()
+        elif char:
+            while (m := _SCALAR_END.search(buf, start)) is None:
+                if not more():
+                    raise ValueError(f"Unterminated value for key {key!r}")
+            end = m.start()
+        else:
+            raise ValueError(f"Missing value for key {key!r}")
+
+        yield key, base + start, buf[start:end]
+
+        pos = end
+        # Drop consumed bytes so the buffer stays about one chunk long
+        if pos >= CHUNK_SIZE:
+            buf = buf[pos:]
+            base += pos
+            pos = 0
+
+
+def iter_records(guide_path):
+    """Yield (dialogue_id, record) pairs from a guide file without loading it whole."""
+    with open(guide_path, 'rb') as f:
+        for key, _, raw in iter_members(f):
+            yield key, json.loads(raw)
+
+
+def _signature(stat):
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def build_index(f, guide_path=None):
+    """Return {dialogue_id: (offset, length)} for binary file f, saving it as a sidecar if guide_path is given."""
+    stat = os.fstat(f.fileno())
+    f.seek(0)
+    offsets = {key: (offset, len(raw)) for key, offset, raw in iter_members(f)}
+
+    if guide_path is not None:
+        index = dict(_signature(stat), version=INDEX_VERSION, offsets=offsets)
+        try:
+            write_json_atomic(index_path(guide_path), index, indent=None)
+            Path(str(guide_path) + LEGACY_INDEX_SUFFIX).unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning("Could not save index for %s: %s", guide_path, e)
+    return offsets
+
+
+def load_index(f, guide_path):
+    """Offsets of the records in guide_path (open as binary file f), from the sidecar when it is current."""
+    expected = dict(_signature(os.fstat(f.fileno())), version=INDEX_VERSION)
+    try:
+        with open(index_path(guide_path), 'r', encoding='utf-8-sig') as index_file:
+            index = json.load(index_file)
+        if all(index.get(name) == value for name, value in expected.items()):
+            return {key: tuple(entry) for key, entry in index["offsets"].items()}
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return build_index(f, guide_path)
+
+
+class IndexedGuide(Mapping):
+    """Read-mostly mapping of dialogue ID to record for one guide file.
+
+    Only the offset index is held in memory; records are read with a single
+    positioned read and parsed on lookup, with the most recent ones cached.
+    The file stays open, so a guide file replaced on disk keeps serving the
+    version the index was built from until it is reloaded. Assigned records
+    (journal overlays) are kept in memory and shadow the file.
+    """
+
+    def __init__(self, guide_path, cache_size=256):
+        self.path = str(guide_path)
+        self.cache_size = cache_size
+        self._file = open(self.path, 'rb')
+        try:
+            self.offsets = load_index(self._file, self.path)
+        except BaseException:
+            self._file.close()
+            raise
+        self._overlay = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _read(self, offset, length):
+        if hasattr(os, 'pread'):
+            return os.pread(self._file.fileno(), length, offset)
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(length)
+
+    def __getitem__(self, dialogue_id):
+        if dialogue_id in self._overlay:
+            return self._overlay[dialogue_id]
+
+        with self._lock:
+            record = self._cache.get(dialogue_id)
+            if record is not None:
+                self._cache.move_to_end(dialogue_id)
+                return record
+
+        offset, length = self.offsets[dialogue_id]
+        record = json.loads(self._read(offset, length))
+        with self._lock:
+            self._cache[dialogue_id] = record
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return record
+
+    def __setitem__(self, dialogue_id, record):
+        if dialogue_id not in self.offsets:
+            raise KeyError(dialogue_id)
+        self._overlay[dialogue_id] = record
+
+    def records(self):
+        """Yield (dialogue_id, record) for every record in file order, bypassing the cache."""
+        for dialogue_id, (offset, length) in self.offsets.items():
+            if dialogue_id in self._overlay:
+                yield dialogue_id, self._overlay[dialogue_id]
+            else:
+                yield dialogue_id, json.loads(self._read(offset, length))
+
+    def __contains__(self, dialogue_id):
+        return dialogue_id in self.offsets
+
+    def __iter__(self):
+        return iter(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,275 @@
+"""Binary snapshots of guide files, read through mmap.
+
+A guide JSON file is pretty-printed, BOM-prefixed text that has to be parsed
+whole by json.load. A snapshot <guide file>.snap holds the same records in a
+form that can be memory-mapped and read one dialogue at a time:
+
+    header        magic, format version, dialogue count, size and mtime of the
+                  guide file it was built from, offsets of the two tables
+    string table  UTF-8 strings: dialogue IDs, guidelines, generated_data
+                  transcripts, and each record's other fields as compact JSON
+    record table  per dialogue in file order: (offset, length) of its ID,
+                  guideline, transcript and other fields in the string table
+    ID index      (offset, length) of each ID and its record number, sorted
+                  by the UTF-8 bytes of the IDs
+
+A lookup binary-searches the ID index and decodes only that dialogue's
+strings; the guideline and transcript, most of a record's bytes, are decoded
+straight from the mapped file with no JSON parsing. The JSON file stays the
+source of truth: load_snapshot() rebuilds a snapshot whose recorded size or
+mtime no longer matches its guide file.
+
+    python guide_snapshot.py export TACT_interraction_datas/multiwoz/*.json
+    python guide_snapshot.py import guide.json.snap restored_guide.json
+"""
+import argparse
+import io
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from collections.abc import Mapping
+from pathlib import Path
+
+from annotation_journal import copy_mode, write_json_atomic
+from guide_reader import iter_members
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SUFFIX = '.snap'
+MAGIC = b'TACTSNAP'
+SNAPSHOT_VERSION = 1
+
+# magic, version, dialogue count, guide size, guide mtime_ns, record table offset, ID index offset
+HEADER = struct.Struct('<8sIIqqQQ')
+# (offset, length) of the ID, guideline, generated_data and the remaining fields
+RECORD = struct.Struct('<QIQIQIQI')
+# ID offset, ID length, record number
+INDEX_ENTRY = struct.Struct('<QII')
+# Length of a field the record does not have
+ABSENT = 0xFFFFFFFF
+TEXT_FIELDS = ('guideline', 'generated_data')
+
+
+def snapshot_path(guide_path):
+    return Path(str(guide_path) + SNAPSHOT_SUFFIX)
+
+
+def write_snapshot(guide_file, out):
+    """Write a snapshot of open binary guide_file to binary file out; returns the dialogue count."""
+    stat = os.fstat(guide_file.fileno())
+    guide_file.seek(0)
+    out.write(bytes(HEADER.size))
+    position = HEADER.size
+
+    def add(text):
+        nonlocal position
+        if text is None:
+            return position, ABSENT
+        data = text.encode('utf-8')
+        out.write(data)
+        position += len(data)
+        return position - len(data), len(data)
+
+    refs = []
+    ids = []
+    positions = {}
+    for key, _, raw in iter_members(guide_file):
+        record = json.loads(raw)
+        texts = [None, None]
+        if isinstance(record, dict):
+            for i, field in enumerate(TEXT_FIELDS):
+                if isinstance(record.get(field), str):
+                    texts[i] = record[field]
+                    # Keeps the field's place in the key order
+                    record[field] = None
+        ref = (add(key), add(texts[0]), add(texts[1]),
+               add(json.dumps(record, ensure_ascii=False, separators=(',', ':'))))
+        if key in positions:
+            # A repeated ID keeps its first position and its last value, as with json.load
+            refs[positions[key]] = ref
+            continue
+        positions[key] = len(refs)
+        ids.append(key.encode('utf-8'))
+        refs.append(ref)
+
+    records_offset = position
+    for ref in refs:
+        out.write(RECORD.pack(*ref[0], *ref[1], *ref[2], *ref[3]))
+    index_offset = records_offset + RECORD.size * len(refs)
+    for number in sorted(range(len(ids)), key=ids.__getitem__):
+        out.write(INDEX_ENTRY.pack(*refs[number][0], number))
+
+    out.seek(0)
+    out.write(HEADER.pack(MAGIC, SNAPSHOT_VERSION, len(refs), stat.st_size, stat.st_mtime_ns,
+                          records_offset, index_offset))
+    return len(refs)
+
+
+def export_snapshot(guide_path):
+    """Write <guide_path>.snap atomically; returns the dialogue count."""
+    path = snapshot_path(guide_path)
+    fd, tmp_path = tempfile.mkstemp(prefix=path.name + '.', suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'wb') as out, open(guide_path, 'rb') as guide_file:
+            count = write_snapshot(guide_file, out)
+        copy_mode(tmp_path, path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return count
+
+
+class GuideSnapshot(Mapping):
+    """Read-mostly mapping of dialogue ID to record over a snapshot buffer (an mmap or bytes).
+
+    Iteration follows the order of the guide file. Like IndexedGuide,
+    assigned records (journal overlays) are kept in memory and shadow the
+    snapshot.
+    """
+
+    def __init__(self, buffer):
+        magic, version, self.count, size, mtime_ns, self._records_offset, self._index_offset = \
+            HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("Not a guide snapshot of version %d" % SNAPSHOT_VERSION)
+        if len(buffer) != self._index_offset + INDEX_ENTRY.size * self.count:
+            raise ValueError("Truncated guide snapshot")
+        self.source_signature = (size, mtime_ns)
+        self._buffer = buffer
+        self._view = memoryview(buffer)
+        self._overlay = {}
+
+    def _refs(self, number):
+        return RECORD.unpack_from(self._buffer, self._records_offset + RECORD.size * number)
+
+    def _string(self, offset, length):
+        return str(self._view[offset:offset + length], 'utf-8')
+
+    def _find(self, dialogue_id):
+        """Record number of dialogue_id, or None."""
+        if not isinstance(dialogue_id, str):
+            return None
+        key = dialogue_id.encode('utf-8')
+        buffer, entry, base = self._buffer, INDEX_ENTRY, self._index_offset
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset, length, number = entry.unpack_from(buffer, base + entry.size * middle)
+            candidate = buffer[offset:offset + length]
+            if candidate == key:
+                return number
+            if candidate < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _record(self, number):
+        refs = self._refs(number)
+        record = json.loads(self._string(refs[6], refs[7]))
+        if isinstance(record, dict):
+            for field, (offset, length) in zip(TEXT_FIELDS, (refs[2:4], refs[4:6])):
+                if length != ABSENT:
+                    record[field] = self._string(offset, length)
+        return record
+
+    def __getitem__(self, dialogue_id):
+        if dialogue_id in self._overlay:
+            return self._overlay[dialogue_id]
+        number = self._find(dialogue_id)
+        if number is None:
+            raise KeyError(dialogue_id)
+        return self._record(number)
+
+    def __setitem__(self, dialogue_id, record):
+        if dialogue_id not in self:
+            raise KeyError(dialogue_id)
+        self._overlay[dialogue_id] = record
+
+    def __contains__(self, dialogue_id):
+        return self._find(dialogue_id) is not None
+
+    def __iter__(self):
+        for number in range(self.count):
+            yield self._string(*self._refs(number)[:2])
+
+    def __len__(self):
+        return self.count
+
+    def records(self):
+        """Yield (dialogue_id, record) for every record in file order."""
+        for number in range(self.count):
+            dialogue_id = self._string(*self._refs(number)[:2])
+            if dialogue_id in self._overlay:
+                yield dialogue_id, self._overlay[dialogue_id]
+            else:
+                yield dialogue_id, self._record(number)
+
+    def close(self):
+        self._view.release()
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+
+def open_snapshot(path):
+    """GuideSnapshot over a memory map of the snapshot file at path."""
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return GuideSnapshot(buffer)
+    except BaseException:
+        buffer.close()
+        raise
+
+
+def load_snapshot(guide_path):
+    """GuideSnapshot of guide_path, rebuilding <guide_path>.snap first when it is missing or stale."""
+    stat = os.stat(guide_path)
+    try:
+        snapshot = open_snapshot(snapshot_path(guide_path))
+        if snapshot.source_signature == (stat.st_size, stat.st_mtime_ns):
+            return snapshot
+        snapshot.close()
+    except (OSError, ValueError, struct.error):
+        pass
+
+    try:
+        count = export_snapshot(guide_path)
+        logger.info("Wrote snapshot of %d dialogues for %s", count, guide_path)
+        return open_snapshot(snapshot_path(guide_path))
+    except OSError as e:
+        # Read-only data directory: keep the snapshot in memory for this process
+        logger.warning("Could not save snapshot of %s: %s", guide_path, e)
+        out = io.BytesIO()
+        with open(guide_path, 'rb') as guide_file:
+            write_snapshot(guide_file, out)
+        return GuideSnapshot(out.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="write <guide file>.snap next to each guide file")
+    export_parser.add_argument("guide_files", nargs="+")
+    import_parser = subparsers.add_parser("import", help="convert a snapshot back into guide JSON")
+    import_parser.add_argument("snapshot")
+    import_parser.add_argument("output", help="guide JSON file to write")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        for guide_file in args.guide_files:
+            count = export_snapshot(guide_file)
+            size = snapshot_path(guide_file).stat().st_size
+            print(f"{snapshot_path(guide_file)}: {count} dialogue(s), {size / 2 ** 20:.1f} MB")
+    else:
+        snapshot = open_snapshot(args.snapshot)
+        write_json_atomic(args.output, dict(snapshot.records()))
+        print(f"{args.output}: {len(snapshot)} dialogue(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""gunicorn settings (read automatically from the working directory).
+
+    gunicorn app:app
+    PRELOAD_CORPUS=true gunicorn app:app
+
+With PRELOAD_CORPUS=true the master imports the app, indexes every dataset and
+freezes the result out of the garbage collector before forking the workers,
+which then share the corpus pages copy-on-write instead of each loading and
+indexing it. Otherwise each worker starts indexing in a background thread as
+soon as it has loaded the app.
+"""
+import os
+import sys
+
+bind = f"{os.getenv('FLASK_HOST', '0.0.0.0')}:{os.getenv('FLASK_PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+# More than one thread switches to the gthread worker
+threads = int(os.getenv("GUNICORN_THREADS", "1"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = os.getenv("PRELOAD_CORPUS", "false").lower() in ["true", "1", "yes"]
+
+
+# Runs in each worker after it has loaded app:app
+def post_worker_init(worker):
+    app_module = sys.modules.get("app")
+    if app_module is not None:
+        app_module.start_background_index()
@@ -0,0 +1,177 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class MemoryHistoryStore:
+    """Per-process dialog histories kept in an LRU of at most max_sessions sessions."""
+
+    def __init__(self, max_sessions=1000):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            messages = self._sessions.get(session_id)
+            if messages is None:
+                return []
+            self._sessions.move_to_end(session_id)
+            return list(messages)
+
+    def append(self, session_id, message):
+        with self._lock:
+            self._sessions.setdefault(session_id, []).append(message)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SQLiteHistoryStore:
+    """Persistent dialog histories, one row per message.
+
+    Each session row carries a message counter and a generation that is bumped
+    on clear, so a cache in front of the store can fetch only the rows it has
+    not seen yet and notice when another process cleared the history.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        self._pid = os.getpid()
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    next_seq INTEGER NOT NULL DEFAULT 0,
+                    generation INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS messages (
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    PRIMARY KEY (session_id, seq)
+                );
+            """)
+
+    # One connection per thread; WAL lets workers read while another writes
+    def _connect(self):
+        if self._pid != os.getpid():
+            # Never use a connection inherited from the parent process
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def state(self, session_id):
+        """Return (generation, message_count) for a session."""
+        row = self._connect().execute(
+            "SELECT generation, next_seq FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row if row else (0, 0)
+
+    def get(self, session_id, start=0):
+        rows = self._connect().execute(
+            "SELECT role, content FROM messages WHERE session_id = ? AND seq >= ? ORDER BY seq",
+            (session_id, start)
+        ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def append(self, session_id, message):
+        """Append one message; returns (generation, message_count) after the write."""
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO sessions (session_id) VALUES (?)", (session_id,))
+            generation, seq = conn.execute(
+                "SELECT generation, next_seq FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            conn.execute(
+                "INSERT INTO messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                (session_id, seq, message['role'], message['content'])
+            )
+            conn.execute("UPDATE sessions SET next_seq = ? WHERE session_id = ?", (seq + 1, session_id))
+        return generation, seq + 1
+
+    def clear(self, session_id):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute(
+                "UPDATE sessions SET generation = generation + 1, next_seq = 0 WHERE session_id = ?",
+                (session_id,)
+            )
+
+
+class TieredHistoryStore:
+    """In-process LRU tier in front of the SQLite tier.
+
+    A cached history is revalidated against the session row on every read and
+    only newer messages are loaded, so several worker processes can share one
+    database without serving stale histories.
+    """
+
+    def __init__(self, path, max_sessions=1000):
+        self.persistent = SQLiteHistoryStore(path)
+        self.max_sessions = max_sessions
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, session_id, generation, messages):
+        with self._lock:
+            self._cache[session_id] = (generation, messages)
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self.max_sessions:
+                self._cache.popitem(last=False)
+
+    def get(self, session_id):
+        generation, count = self.persistent.state(session_id)
+        with self._lock:
+            cached = self._cache.get(session_id)
+
+        if cached and cached[0] == generation and len(cached[1]) <= count:
+            messages = cached[1]
+            if len(messages) < count:
+                messages = messages + self.persistent.get(session_id, start=len(messages))
+        else:
+            messages = self.persistent.get(session_id)
+
+        self._remember(session_id, generation, messages)
+        return list(messages)
+
+    def append(self, session_id, message):
+        generation, count = self.persistent.append(session_id, message)
+        with self._lock:
+            cached = self._cache.get(session_id)
+            if cached and cached[0] == generation and len(cached[1]) == count - 1:
+                cached[1].append(message)
+                self._cache.move_to_end(session_id)
+            else:
+                self._cache.pop(session_id, None)
+
+    def clear(self, session_id):
+        self.persistent.clear(session_id)
+        with self._lock:
+            self._cache.pop(session_id, None)
+
+
+# Build the store selected by CONFIG["history_store"]
+def create_history_store(config):
+    backend = config["history_store"]
+    if backend == "memory":
+        return MemoryHistoryStore(config["history_cache_size"])
+    if backend == "sqlite":
+        return SQLiteHistoryStore(config["history_db_path"])
+    if backend == "tiered":
+        return TieredHistoryStore(config["history_db_path"], config["history_cache_size"])
+    raise ValueError(f"Unknown history store: {backend}")
@@ -0,0 +1,66 @@
+import itertools
+import math
+
+import httpx
+import openai
+
+
+# Connection pool limits and timeouts taken from the app CONFIG
+def http_limits(config, shards=1):
+    return httpx.Limits(
+        max_connections=math.ceil(config["http_max_connections"] / shards),
+        max_keepalive_connections=math.ceil(config["http_max_keepalive"] / shards),
+        keepalive_expiry=config["http_keepalive_expiry"]
+    )
+
+def http_timeout(config):
+    return httpx.Timeout(
+        config["http_read_timeout"],
+        connect=config["http_connect_timeout"]
+    )
+
+# Synchronous client used by the Flask views
+def create_openai_client(config, api_key):
+    http_client = httpx.Client(
+        limits=http_limits(config),
+        timeout=http_timeout(config)
+    )
+    return openai.OpenAI(
+        api_key=api_key,
+        base_url=config["openai_base_url"],
+        http_client=http_client
+    )
+
+# Async client on a keep-alive pool; create it inside the event loop that will use it
+def create_async_openai_client(config, api_key, shards=1):
+    http_client = httpx.AsyncClient(
+        limits=http_limits(config, shards),
+        timeout=http_timeout(config)
+    )
+    return openai.AsyncOpenAI(
+        api_key=api_key,
+        base_url=config["openai_base_url"],
+        http_client=http_client
+    )
+
+
+class AsyncOpenAIPool:
+    """Shared async clients for one event loop, handed out round-robin.
+
+    httpcore checks every pooled connection each time it dispatches a queued
+    request, so a single pool of a few hundred connections turns CPU bound.
+    Splitting the connection limit across HTTP_POOL_SHARDS clients keeps those
+    scans short while the total number of connections stays the same.
+    """
+
+    def __init__(self, config, api_key):
+        shards = max(1, config["http_pool_shards"])
+        self.clients = [create_async_openai_client(config, api_key, shards) for _ in range(shards)]
+        self._next = itertools.cycle(self.clients)
+
+    def get(self):
+        return next(self._next)
+
+    async def close(self):
+        for client in self.clients:
+            await client.close()
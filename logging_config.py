@@ -0,0 +1,47 @@
+"""Non-blocking logging setup.
+
+Request threads only put records on an in-memory queue; a QueueListener
+thread formats them and does the (blocking) write to stderr. Forked
+processes (gunicorn --preload workers) start a listener thread of their own.
+"""
+import atexit
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Libraries that log every request at INFO
+QUIET_LOGGERS = ("httpx", "httpcore", "openai")
+
+_listener = None
+
+
+def configure_logging(level="INFO"):
+    """Route all logging through a queue to stderr; calling it again only updates the level."""
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    log_queue = queue.SimpleQueue()
+    root.addHandler(QueueHandler(log_queue))
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(max(logging.WARNING, root.level))
+
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    # Flush queued records on exit
+    atexit.register(_listener.stop)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_listener)
+
+
+def _restart_listener():
+    # The listener thread does not survive a fork; records would pile up in the queue
+    _listener._thread = None
+    _listener.start()
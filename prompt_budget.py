@@ -0,0 +1,131 @@
+import functools
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Chat formatting overhead per message and for priming the reply (OpenAI cookbook figures)
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """tiktoken's o200k/cl100k encoding if it is installed and its BPE file is available offline."""
+    global _encoding
+    if tiktoken is None:
+        return None
+    with _encoding_lock:
+        if _encoding is None:
+            for name in ("o200k_base", "cl100k_base"):
+                try:
+                    _encoding = tiktoken.get_encoding(name)
+                    break
+                except Exception:
+                    continue
+            else:
+                _encoding = False
+    return _encoding or None
+
+
+@functools.lru_cache(maxsize=65536)
+def count_tokens(text):
+    """Token count of a message body, memoized so history is only counted once."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # Roughly four characters per token for English text
+    return math.ceil(len(text) / 4)
+
+
+def message_tokens(message):
+    return TOKENS_PER_MESSAGE + count_tokens(message['content'])
+
+
+def fit_messages(messages, max_prompt_tokens, summarize=None, summary_block=6):
+    """Trim chat messages to max_prompt_tokens.
+
+    Keeps a leading system message and the final message (the current user
+    turn), then as many of the most recent history messages as fit. If
+    summarize is given, the dropped messages are replaced by a system message
+    with summarize(dropped); the cut point is rounded up to a multiple of
+    summary_block messages so the same prefix, and its cached summary, is
+    reused across several turns.
+
+    Returns (messages, info) where info has prompt_tokens, dropped_messages and
+    summarized.
+    """
+    head = messages[:1] if messages and messages[0]['role'] == 'system' else []
+    tail = messages[-1:] if len(messages) > len(head) else []
+    history = messages[len(head):len(messages) - len(tail)]
+
+    fixed = TOKENS_PER_REPLY + sum(message_tokens(m) for m in head + tail)
+    history_tokens = [message_tokens(m) for m in history]
+    total = fixed + sum(history_tokens)
+    if total <= max_prompt_tokens:
+        return messages, {"prompt_tokens": total, "dropped_messages": 0, "summarized": False}
+
+    # Smallest cut so that history[cut:] fits
+    cut = 0
+    while cut < len(history) and total > max_prompt_tokens:
+        total -= history_tokens[cut]
+        cut += 1
+
+    summary_message = None
+    if summarize is not None and cut:
+        while True:
+            cut = min(len(history), math.ceil(cut / summary_block) * summary_block)
+            summary = summarize(history[:cut])
+            if not summary:
+                break
+            summary_message = {"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}
+            total = fixed + sum(history_tokens[cut:]) + message_tokens(summary_message)
+            if total <= max_prompt_tokens or cut == len(history):
+                break
+            # The summary itself does not fit: summarize one more block
+            cut += 1
+    if summary_message is None:
+        total = fixed + sum(history_tokens[cut:])
+
+    fitted = head + ([summary_message] if summary_message else []) + history[cut:] + tail
+    return fitted, {"prompt_tokens": total, "dropped_messages": cut, "summarized": summary_message is not None}
+
+
+class SummaryCache:
+    """LRU of summaries keyed by a hash of the summarized messages."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(messages):
+        payload = json.dumps([[m['role'], m['content']] for m in messages], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_or_create(self, messages, summarize):
+        key = self.key(messages)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        summary = summarize(messages)
+        with self._lock:
+            self._entries[key] = summary
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return summary
@@ -0,0 +1,109 @@
+"""Parsing of generated_data transcripts into turns.
+
+A transcript has one turn per line:
+
+    0 [USER] [find_hotel] I'm trying to find the Alexander Bed and Breakfast.
+    1 [SYSTEM] [Transition to ToD] They really do! ...
+
+DialogueTurns parses a transcript lazily, only as far as the turns asked
+for, and TurnCache keeps parsed dialogues per (file, dialogue_id, mtime) so
+a page render or a sampling pass does not parse the same dialogue twice.
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+TURN_PATTERN = re.compile(r'(\d+) \[(USER|SYSTEM)\](?: \[([^\]]+)\])? ?(.*)')
+
+
+class Turn(NamedTuple):
+    index: int
+    speaker: Optional[str]   # "USER" or "SYSTEM"; None for a line that is not a turn
+    intent: Optional[str]    # intent tag of a user turn, or tag such as "Transition to ToD" of a system turn
+    text: str
+
+
+def parse_turn(line, position):
+    match = TURN_PATTERN.match(line)
+    if match is None:
+        return Turn(position, None, None, line)
+    index, speaker, intent, text = match.groups()
+    return Turn(int(index), speaker, intent, text)
+
+
+class DialogueTurns:
+    """Turns of one transcript, parsed line by line as they are requested."""
+
+    __slots__ = ('text', '_turns', '_position', '_lock')
+
+    def __init__(self, text):
+        self.text = text.strip()
+        self._turns = []
+        self._position = 0 if self.text else None
+        self._lock = threading.Lock()
+
+    def _parse_until(self, count):
+        with self._lock:
+            while self._position is not None and (count is None or len(self._turns) < count):
+                end = self.text.find('\n', self._position)
+                line = self.text[self._position:] if end < 0 else self.text[self._position:end]
+                self._turns.append(parse_turn(line, len(self._turns)))
+                self._position = None if end < 0 else end + 1
+
+    def head(self, count):
+        """The first count turns, parsing no further than needed."""
+        if len(self._turns) < count:
+            self._parse_until(count)
+        return self._turns[:count]
+
+    def all(self):
+        self._parse_until(None)
+        return list(self._turns)
+
+    def __iter__(self):
+        position = 0
+        while True:
+            if position >= len(self._turns):
+                self._parse_until(position + 1)
+                if position >= len(self._turns):
+                    return
+            yield self._turns[position]
+            position += 1
+
+    def user_intents(self):
+        """Intent tags of the user turns, in order."""
+        return [turn.intent for turn in self if turn.speaker == "USER" and turn.intent]
+
+
+class TurnCache:
+    """LRU of DialogueTurns keyed by (file path, dialogue ID, file mtime).
+
+    The key changes whenever the file does, and journal overlays only touch
+    dialogue_history, so a lookup only checks the transcript's length, a cheap
+    guard against a record replaced in memory, instead of the whole text.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, text):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == len(text):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        turns = DialogueTurns(text)
+        with self._lock:
+            self._entries[key] = (len(text), turns)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return turns